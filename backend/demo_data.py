@@ -6,15 +6,145 @@ LARGE DATASET for impressive hackathon demo
 """
 import sys
 from pathlib import Path
+from typing import Dict
 
 # Add shared folder to path
 shared_path = Path(__file__).parent.parent / "shared"
-sys.path.insert(0, str(shared_path))
+if str(shared_path) not in sys.path:
+    sys.path.insert(0, str(shared_path))
 
 from smart_queue import SmartQueue
 from bed_registery import BedRegistry
 
 
+# Demo beds: (bed_type, section, features)
+BED_DATA = (
+    # Emergency Department (15 beds)
+    ("ED", "ED-A1", ("cardiac_monitor",)),
+    ("ED", "ED-A2", ()),
+    ("ED", "ED-A3", ("isolation",)),
+    ("ED", "ED-A4", ("cardiac_monitor",)),
+    ("ED", "ED-B1", ("cardiac_monitor",)),
+    ("ED", "ED-B2", ()),
+    ("ED", "ED-B3", ()),
+    ("ED", "ED-B4", ("isolation",)),
+    ("ED", "ED-C1", ("trauma_bay",)),
+    ("ED", "ED-C2", ("trauma_bay",)),
+    ("ED", "ED-D1", ()),
+    ("ED", "ED-D2", ("cardiac_monitor",)),
+    ("ED", "ED-D3", ()),
+    ("ED", "ED-D4", ()),
+    ("ED", "ED-E1", ("pediatric",)),
+
+    # ICU (8 beds)
+    ("ICU", "ICU-1", ("ventilator", "cardiac_monitor")),
+    ("ICU", "ICU-2", ("ventilator", "cardiac_monitor")),
+    ("ICU", "ICU-3", ("ventilator",)),
+    ("ICU", "ICU-4", ("ventilator", "cardiac_monitor")),
+    ("ICU", "ICU-5", ("ventilator",)),
+    ("ICU", "ICU-6", ("ventilator", "cardiac_monitor")),
+    ("ICU", "ICU-7", ("ventilator",)),
+    ("ICU", "ICU-8", ("ventilator", "cardiac_monitor")),
+
+    # Med-Surg (12 beds)
+    ("MED_SURG", "MS-201", ()),
+    ("MED_SURG", "MS-202", ()),
+    ("MED_SURG", "MS-203", ("telemetry",)),
+    ("MED_SURG", "MS-204", ()),
+    ("MED_SURG", "MS-205", ("telemetry",)),
+    ("MED_SURG", "MS-206", ()),
+    ("MED_SURG", "MS-301", ()),
+    ("MED_SURG", "MS-302", ("telemetry",)),
+    ("MED_SURG", "MS-303", ()),
+    ("MED_SURG", "MS-304", ()),
+    ("MED_SURG", "MS-305", ("telemetry",)),
+    ("MED_SURG", "MS-306", ()),
+
+    # Step-Down (6 beds)
+    ("STEP_DOWN", "SD-101", ("telemetry", "cardiac_monitor")),
+    ("STEP_DOWN", "SD-102", ("telemetry",)),
+    ("STEP_DOWN", "SD-103", ("telemetry", "cardiac_monitor")),
+    ("STEP_DOWN", "SD-104", ("telemetry",)),
+    ("STEP_DOWN", "SD-105", ("telemetry", "cardiac_monitor")),
+    ("STEP_DOWN", "SD-106", ("telemetry",)),
+
+    # Pediatrics (6 beds)
+    ("PEDS", "PEDS-1", ("pediatric",)),
+    ("PEDS", "PEDS-2", ("pediatric",)),
+    ("PEDS", "PEDS-3", ("pediatric", "isolation")),
+    ("PEDS", "PEDS-4", ("pediatric",)),
+    ("PEDS", "PEDS-5", ("pediatric",)),
+    ("PEDS", "PEDS-6", ("pediatric", "cardiac_monitor")),
+
+    # Psych (4 beds)
+    ("PSYCH", "PSYCH-A", ("secure",)),
+    ("PSYCH", "PSYCH-B", ("secure",)),
+    ("PSYCH", "PSYCH-C", ("secure",)),
+    ("PSYCH", "PSYCH-D", ("secure",)),
+)
+
+# Uniform departments, generated inside SQLite:
+# (bed_type, section_prefix, count, features) -> <prefix>1..<prefix>count
+BED_SERIES = (
+    ("LD", "LD-", 4, ("fetal_monitor",)),   # Labor & Delivery
+    ("OR", "OR-", 4, ("surgical",)),        # Operating Room
+    ("PACU", "PACU-", 6, ("post_op",)),     # PACU
+    ("OBS", "OBS-", 4, ()),                 # Observation
+)
+
+# Demo patients: (name, esi, chief_complaint, age, gender, department)
+PATIENT_DATA = (
+    # ED patients (15 patients - mix of severities)
+    ("John Smith", 2, "Chest pain", 65, "M", "ED"),
+    ("Mary Johnson", 1, "Severe trauma from MVA", 42, "F", "ED"),
+    ("Robert Brown", 3, "Abdominal pain", 55, "M", "ED"),
+    ("Patricia Davis", 4, "Ankle sprain", 28, "F", "ED"),
+    ("Michael Wilson", 2, "Difficulty breathing", 70, "M", "ED"),
+    ("Jennifer Garcia", 3, "Severe headache", 38, "F", "ED"),
+    ("David Lee", 2, "Stroke symptoms", 68, "M", "ED"),
+    ("Lisa Rodriguez", 4, "Nausea and vomiting", 45, "F", "ED"),
+    ("James Taylor", 5, "Minor laceration", 22, "M", "ED"),
+    ("Barbara Moore", 3, "Back pain", 52, "F", "ED"),
+    ("William Jackson", 1, "Cardiac arrest", 75, "M", "ED"),
+    ("Susan White", 4, "UTI symptoms", 63, "F", "ED"),
+    ("Christopher Harris", 3, "Pneumonia", 58, "M", "ED"),
+    ("Nancy Martin", 5, "Cold symptoms", 35, "F", "ED"),
+    ("Daniel Thompson", 2, "Severe allergic reaction", 41, "M", "ED"),
+
+    # ICU patients (4 patients - critical)
+    ("Linda Martinez", 1, "Septic shock", 58, "F", "ICU"),
+    ("Richard Anderson", 1, "Respiratory failure", 72, "M", "ICU"),
+    ("Karen Thomas", 1, "Multi-organ failure", 64, "F", "ICU"),
+    ("Mark Davis", 1, "Post-surgical complications", 56, "M", "ICU"),
+
+    # Pediatric patients (5 patients)
+    ("Emily Chen", 3, "High fever", 7, "F", "PEDS"),
+    ("Noah Williams", 4, "Ear infection", 5, "M", "PEDS"),
+    ("Sophia Martinez", 2, "Asthma attack", 9, "F", "PEDS"),
+    ("Liam Johnson", 4, "Stomach flu", 6, "M", "PEDS"),
+    ("Olivia Brown", 3, "Dehydration", 3, "F", "PEDS"),
+
+    # Med-Surg patients (4 patients)
+    ("James Anderson", 5, "Post-op recovery", 45, "M", "MED_SURG"),
+    ("Dorothy Wilson", 4, "Diabetes management", 67, "F", "MED_SURG"),
+    ("George Clark", 3, "Cellulitis", 54, "M", "MED_SURG"),
+    ("Ruth Lewis", 4, "Hypertension", 71, "F", "MED_SURG"),
+
+    # L&D patients (3 patients)
+    ("Sarah Thompson", 2, "Active labor", 32, "F", "LD"),
+    ("Jessica Walker", 3, "Preeclampsia monitoring", 28, "F", "LD"),
+    ("Amanda Hall", 2, "Premature labor", 25, "F", "LD"),
+
+    # PSYCH patients (2 patients)
+    ("Timothy Allen", 3, "Suicidal ideation", 34, "M", "PSYCH"),
+    ("Michelle Young", 3, "Psychotic episode", 29, "F", "PSYCH"),
+
+    # Step-Down patients (2 patients)
+    ("Paul King", 3, "Post-MI monitoring", 61, "M", "STEP_DOWN"),
+    ("Betty Wright", 3, "CHF exacerbation", 78, "F", "STEP_DOWN"),
+)
+
+
 def create_demo_data():
     """Create demo beds and patients for hackathon demo"""
 
@@ -29,176 +159,44 @@ def create_demo_data():
     # Add sample beds across departments (EXPANDED)
     # ============================================================================
     print("\nAdding beds...")
-    bed_data = [
-        # Emergency Department (15 beds)
-        {"bed_type": "ED", "section": "ED-A1", "features": ["cardiac_monitor"]},
-        {"bed_type": "ED", "section": "ED-A2", "features": []},
-        {"bed_type": "ED", "section": "ED-A3", "features": ["isolation"]},
-        {"bed_type": "ED", "section": "ED-A4", "features": ["cardiac_monitor"]},
-        {"bed_type": "ED", "section": "ED-B1", "features": ["cardiac_monitor"]},
-        {"bed_type": "ED", "section": "ED-B2", "features": []},
-        {"bed_type": "ED", "section": "ED-B3", "features": []},
-        {"bed_type": "ED", "section": "ED-B4", "features": ["isolation"]},
-        {"bed_type": "ED", "section": "ED-C1", "features": ["trauma_bay"]},
-        {"bed_type": "ED", "section": "ED-C2", "features": ["trauma_bay"]},
-        {"bed_type": "ED", "section": "ED-D1", "features": []},
-        {"bed_type": "ED", "section": "ED-D2", "features": ["cardiac_monitor"]},
-        {"bed_type": "ED", "section": "ED-D3", "features": []},
-        {"bed_type": "ED", "section": "ED-D4", "features": []},
-        {"bed_type": "ED", "section": "ED-E1", "features": ["pediatric"]},
-
-        # ICU (8 beds)
-        {"bed_type": "ICU", "section": "ICU-1", "features": ["ventilator", "cardiac_monitor"]},
-        {"bed_type": "ICU", "section": "ICU-2", "features": ["ventilator", "cardiac_monitor"]},
-        {"bed_type": "ICU", "section": "ICU-3", "features": ["ventilator"]},
-        {"bed_type": "ICU", "section": "ICU-4", "features": ["ventilator", "cardiac_monitor"]},
-        {"bed_type": "ICU", "section": "ICU-5", "features": ["ventilator"]},
-        {"bed_type": "ICU", "section": "ICU-6", "features": ["ventilator", "cardiac_monitor"]},
-        {"bed_type": "ICU", "section": "ICU-7", "features": ["ventilator"]},
-        {"bed_type": "ICU", "section": "ICU-8", "features": ["ventilator", "cardiac_monitor"]},
-
-        # Med-Surg (12 beds)
-        {"bed_type": "MED_SURG", "section": "MS-201", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-202", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-203", "features": ["telemetry"]},
-        {"bed_type": "MED_SURG", "section": "MS-204", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-205", "features": ["telemetry"]},
-        {"bed_type": "MED_SURG", "section": "MS-206", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-301", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-302", "features": ["telemetry"]},
-        {"bed_type": "MED_SURG", "section": "MS-303", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-304", "features": []},
-        {"bed_type": "MED_SURG", "section": "MS-305", "features": ["telemetry"]},
-        {"bed_type": "MED_SURG", "section": "MS-306", "features": []},
-
-        # Step-Down (6 beds)
-        {"bed_type": "STEP_DOWN", "section": "SD-101", "features": ["telemetry", "cardiac_monitor"]},
-        {"bed_type": "STEP_DOWN", "section": "SD-102", "features": ["telemetry"]},
-        {"bed_type": "STEP_DOWN", "section": "SD-103", "features": ["telemetry", "cardiac_monitor"]},
-        {"bed_type": "STEP_DOWN", "section": "SD-104", "features": ["telemetry"]},
-        {"bed_type": "STEP_DOWN", "section": "SD-105", "features": ["telemetry", "cardiac_monitor"]},
-        {"bed_type": "STEP_DOWN", "section": "SD-106", "features": ["telemetry"]},
-
-        # Pediatrics (6 beds)
-        {"bed_type": "PEDS", "section": "PEDS-1", "features": ["pediatric"]},
-        {"bed_type": "PEDS", "section": "PEDS-2", "features": ["pediatric"]},
-        {"bed_type": "PEDS", "section": "PEDS-3", "features": ["pediatric", "isolation"]},
-        {"bed_type": "PEDS", "section": "PEDS-4", "features": ["pediatric"]},
-        {"bed_type": "PEDS", "section": "PEDS-5", "features": ["pediatric"]},
-        {"bed_type": "PEDS", "section": "PEDS-6", "features": ["pediatric", "cardiac_monitor"]},
-
-        # Labor & Delivery (4 beds)
-        {"bed_type": "LD", "section": "LD-1", "features": ["fetal_monitor"]},
-        {"bed_type": "LD", "section": "LD-2", "features": ["fetal_monitor"]},
-        {"bed_type": "LD", "section": "LD-3", "features": ["fetal_monitor"]},
-        {"bed_type": "LD", "section": "LD-4", "features": ["fetal_monitor"]},
-
-        # Psych (4 beds)
-        {"bed_type": "PSYCH", "section": "PSYCH-A", "features": ["secure"]},
-        {"bed_type": "PSYCH", "section": "PSYCH-B", "features": ["secure"]},
-        {"bed_type": "PSYCH", "section": "PSYCH-C", "features": ["secure"]},
-        {"bed_type": "PSYCH", "section": "PSYCH-D", "features": ["secure"]},
-
-        # Operating Room (4 beds)
-        {"bed_type": "OR", "section": "OR-1", "features": ["surgical"]},
-        {"bed_type": "OR", "section": "OR-2", "features": ["surgical"]},
-        {"bed_type": "OR", "section": "OR-3", "features": ["surgical"]},
-        {"bed_type": "OR", "section": "OR-4", "features": ["surgical"]},
-
-        # PACU (6 beds)
-        {"bed_type": "PACU", "section": "PACU-1", "features": ["post_op"]},
-        {"bed_type": "PACU", "section": "PACU-2", "features": ["post_op"]},
-        {"bed_type": "PACU", "section": "PACU-3", "features": ["post_op"]},
-        {"bed_type": "PACU", "section": "PACU-4", "features": ["post_op"]},
-        {"bed_type": "PACU", "section": "PACU-5", "features": ["post_op"]},
-        {"bed_type": "PACU", "section": "PACU-6", "features": ["post_op"]},
-
-        # Observation (4 beds)
-        {"bed_type": "OBS", "section": "OBS-1", "features": []},
-        {"bed_type": "OBS", "section": "OBS-2", "features": []},
-        {"bed_type": "OBS", "section": "OBS-3", "features": []},
-        {"bed_type": "OBS", "section": "OBS-4", "features": []},
-    ]
-
-    for b in bed_data:
-        bed_id = beds.add_bed(
-            bed_type=b["bed_type"],
-            section=b["section"],
-            features=b["features"]
-        )
-        print(f"  Created bed: {b['section']:10s} ({b['bed_type']:10s}) - ID: {bed_id[:8]}...")
+
+    # Insert all beds in a single transaction
+    bed_ids = beds.add_beds_bulk(BED_DATA)
+    for (bed_type, section, _), bed_id in zip(BED_DATA, bed_ids):
+        print(f"  Created bed: {section:10s} ({bed_type:10s}) - ID: {bed_id[:8]}...")
+
+    for bed_type, prefix, count, features in BED_SERIES:
+        beds.add_bed_series(bed_type, prefix, count, features)
+        print(f"  Created beds: {prefix}1..{prefix}{count} ({bed_type:10s})")
+
+    # Let the query planner see the freshly loaded table
+    beds.store.analyze()
 
     # ============================================================================
     # Add sample patients across departments (EXPANDED - 30+ patients)
     # ============================================================================
     print(f"\nAdding {30}+ patients...")
-    patient_data = [
-        # ED patients (15 patients - mix of severities)
-        {"name": "John Smith", "esi": 2, "chief_complaint": "Chest pain", "age": 65, "gender": "M", "department": "ED"},
-        {"name": "Mary Johnson", "esi": 1, "chief_complaint": "Severe trauma from MVA", "age": 42, "gender": "F", "department": "ED"},
-        {"name": "Robert Brown", "esi": 3, "chief_complaint": "Abdominal pain", "age": 55, "gender": "M", "department": "ED"},
-        {"name": "Patricia Davis", "esi": 4, "chief_complaint": "Ankle sprain", "age": 28, "gender": "F", "department": "ED"},
-        {"name": "Michael Wilson", "esi": 2, "chief_complaint": "Difficulty breathing", "age": 70, "gender": "M", "department": "ED"},
-        {"name": "Jennifer Garcia", "esi": 3, "chief_complaint": "Severe headache", "age": 38, "gender": "F", "department": "ED"},
-        {"name": "David Lee", "esi": 2, "chief_complaint": "Stroke symptoms", "age": 68, "gender": "M", "department": "ED"},
-        {"name": "Lisa Rodriguez", "esi": 4, "chief_complaint": "Nausea and vomiting", "age": 45, "gender": "F", "department": "ED"},
-        {"name": "James Taylor", "esi": 5, "chief_complaint": "Minor laceration", "age": 22, "gender": "M", "department": "ED"},
-        {"name": "Barbara Moore", "esi": 3, "chief_complaint": "Back pain", "age": 52, "gender": "F", "department": "ED"},
-        {"name": "William Jackson", "esi": 1, "chief_complaint": "Cardiac arrest", "age": 75, "gender": "M", "department": "ED"},
-        {"name": "Susan White", "esi": 4, "chief_complaint": "UTI symptoms", "age": 63, "gender": "F", "department": "ED"},
-        {"name": "Christopher Harris", "esi": 3, "chief_complaint": "Pneumonia", "age": 58, "gender": "M", "department": "ED"},
-        {"name": "Nancy Martin", "esi": 5, "chief_complaint": "Cold symptoms", "age": 35, "gender": "F", "department": "ED"},
-        {"name": "Daniel Thompson", "esi": 2, "chief_complaint": "Severe allergic reaction", "age": 41, "gender": "M", "department": "ED"},
-
-        # ICU patients (4 patients - critical)
-        {"name": "Linda Martinez", "esi": 1, "chief_complaint": "Septic shock", "age": 58, "gender": "F", "department": "ICU"},
-        {"name": "Richard Anderson", "esi": 1, "chief_complaint": "Respiratory failure", "age": 72, "gender": "M", "department": "ICU"},
-        {"name": "Karen Thomas", "esi": 1, "chief_complaint": "Multi-organ failure", "age": 64, "gender": "F", "department": "ICU"},
-        {"name": "Mark Davis", "esi": 1, "chief_complaint": "Post-surgical complications", "age": 56, "gender": "M", "department": "ICU"},
-
-        # Pediatric patients (5 patients)
-        {"name": "Emily Chen", "esi": 3, "chief_complaint": "High fever", "age": 7, "gender": "F", "department": "PEDS"},
-        {"name": "Noah Williams", "esi": 4, "chief_complaint": "Ear infection", "age": 5, "gender": "M", "department": "PEDS"},
-        {"name": "Sophia Martinez", "esi": 2, "chief_complaint": "Asthma attack", "age": 9, "gender": "F", "department": "PEDS"},
-        {"name": "Liam Johnson", "esi": 4, "chief_complaint": "Stomach flu", "age": 6, "gender": "M", "department": "PEDS"},
-        {"name": "Olivia Brown", "esi": 3, "chief_complaint": "Dehydration", "age": 3, "gender": "F", "department": "PEDS"},
-
-        # Med-Surg patients (4 patients)
-        {"name": "James Anderson", "esi": 5, "chief_complaint": "Post-op recovery", "age": 45, "gender": "M", "department": "MED_SURG"},
-        {"name": "Dorothy Wilson", "esi": 4, "chief_complaint": "Diabetes management", "age": 67, "gender": "F", "department": "MED_SURG"},
-        {"name": "George Clark", "esi": 3, "chief_complaint": "Cellulitis", "age": 54, "gender": "M", "department": "MED_SURG"},
-        {"name": "Ruth Lewis", "esi": 4, "chief_complaint": "Hypertension", "age": 71, "gender": "F", "department": "MED_SURG"},
-
-        # L&D patients (3 patients)
-        {"name": "Sarah Thompson", "esi": 2, "chief_complaint": "Active labor", "age": 32, "gender": "F", "department": "LD"},
-        {"name": "Jessica Walker", "esi": 3, "chief_complaint": "Preeclampsia monitoring", "age": 28, "gender": "F", "department": "LD"},
-        {"name": "Amanda Hall", "esi": 2, "chief_complaint": "Premature labor", "age": 25, "gender": "F", "department": "LD"},
-
-        # PSYCH patients (2 patients)
-        {"name": "Timothy Allen", "esi": 3, "chief_complaint": "Suicidal ideation", "age": 34, "gender": "M", "department": "PSYCH"},
-        {"name": "Michelle Young", "esi": 3, "chief_complaint": "Psychotic episode", "age": 29, "gender": "F", "department": "PSYCH"},
-
-        # Step-Down patients (2 patients)
-        {"name": "Paul King", "esi": 3, "chief_complaint": "Post-MI monitoring", "age": 61, "gender": "M", "department": "STEP_DOWN"},
-        {"name": "Betty Wright", "esi": 3, "chief_complaint": "CHF exacerbation", "age": 78, "gender": "F", "department": "STEP_DOWN"},
-    ]
-
-    for p in patient_data:
+
+    # One queue per department (each SmartQueue opens its own DB handle)
+    queues: Dict[str, SmartQueue] = {"ED": queue}
+    for name, esi, chief_complaint, age, gender, department in PATIENT_DATA:
         # Create patient in appropriate queue
-        dept_queue = SmartQueue(department=p.get("department", "ED"))
+        dept_queue = queues.get(department)
+        if dept_queue is None:
+            dept_queue = queues[department] = SmartQueue(department=department)
         patient_id = dept_queue.add_patient(
-            name=p["name"],
-            esi=p["esi"],
-            chief_complaint=p["chief_complaint"],
-            age=p["age"],
-            gender=p["gender"]
+            name=name,
+            esi=esi,
+            chief_complaint=chief_complaint,
+            age=age,
+            gender=gender
         )
-        print(f"  Created: {p['name']:20s} (ESI {p['esi']}, {p.get('department', 'ED'):10s}) - ID: {patient_id[:8]}...")
+        print(f"  Created: {name:20s} (ESI {esi}, {department:10s}) - ID: {patient_id[:8]}...")
 
     print("\n" + "=" * 60)
     print("LARGE DEMO DATASET CREATED!")
-    print(f"Total beds: {len(beds.list_beds())} across all departments")
-    print(f"Total patients: {len(patient_data)} across all departments")
+    print(f"Total beds: {beds.count_beds()} across all departments")
+    print(f"Total patients: {len(PATIENT_DATA)} across all departments")
     print("=" * 60)
 
     return queue, beds
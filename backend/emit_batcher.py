@@ -0,0 +1,105 @@
+# emit_batcher.py
+"""
+Debounced, coalesced Socket.IO broadcasts.
+
+Mutation handlers used to `await sio.emit(...)` once per change, so a
+burst (demo import, rapid triage clicks) produced one websocket frame and
+one JSON encode per event per client. Handlers now push events into an
+EmitBatcher and return immediately; a background task waits a short
+window after the first pending event and sends everything that queued up
+as a single `state:delta` broadcast:
+
+    {"patient:updated": [patient, ...], "bed:updated": [bed, ...]}
+
+Within a batch, repeated events for the same record (same event name and
+payload "id") collapse to the latest payload, so a patient that moves
+through three statuses in one window goes out once.
+
+The batch is serialized once with orjson before the emit (see
+socket_codec), however many clients are connected.
+"""
+import asyncio
+import itertools
+import traceback
+from typing import Any, Dict, Hashable, Optional
+
+import socketio
+
+from socket_codec import encode
+
+DELTA_EVENT = 'state:delta'
+DEFAULT_WINDOW_SECONDS = 0.05
+
+
+class EmitBatcher:
+    """
+    Collects broadcast events and flushes them as one state:delta emit.
+
+    With legacy_events=True each (deduplicated) event is also re-sent under
+    its own name, for clients that predate state:delta.
+    """
+
+    def __init__(
+        self,
+        sio: socketio.AsyncServer,
+        window: float = DEFAULT_WINDOW_SECONDS,
+        legacy_events: bool = False,
+    ):
+        self.sio = sio
+        self.window = window
+        self.legacy_events = legacy_events
+        # event -> {record id: latest payload}, in first-seen order
+        self._pending: Dict[str, Dict[Hashable, Any]] = {}
+        # Keys for payloads without an "id", so they're never merged
+        self._anon = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, event: str, payload: Any) -> None:
+        """Queue an event for the next batch (call from the event loop)"""
+        key = payload.get('id') if isinstance(payload, dict) else None
+        if key is None:
+            key = ('anon', next(self._anon))
+        self._pending.setdefault(event, {})[key] = payload
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the background flush task (call once the loop is running)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and send whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Emit all pending events now as one state:delta"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        batch = {event: list(by_id.values()) for event, by_id in pending.items()}
+        await self.sio.emit(DELTA_EVENT, encode(batch))
+        if self.legacy_events:
+            for event, payloads in batch.items():
+                for payload in payloads:
+                    await self.sio.emit(event, encode(payload))
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            # Debounce: let the rest of the burst arrive before sending
+            await asyncio.sleep(self.window)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # That batch is lost, but keep the task alive so later
+                # broadcasts still go out
+                traceback.print_exc()
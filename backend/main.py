@@ -2,22 +2,35 @@
 """
 ER Flow Dashboard - FastAPI Backend with Socket.IO
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, List, Optional
+import asyncio
 import socketio
 import sys
 import os
 from pathlib import Path
+from urllib.parse import parse_qs
 
 # Add shared folder to path
 shared_path = Path(__file__).parent.parent / "shared"
-sys.path.insert(0, str(shared_path))
+if str(shared_path) not in sys.path:
+    sys.path.insert(0, str(shared_path))
 
+from bed import check_feature_name
+from patient import ESI_MAX, ESI_MIN
 from smart_queue import SmartQueue
+from patient_db import SQLitePatientStore
 from bed_registery import BedRegistry
+from bed_db import DB_PATH, SQLiteBedStore
+from storage_worker import StorageWorker, StorageWriteError
+from snapshot_cache import SnapshotCache
+from emit_batcher import EmitBatcher
+from socket_codec import OrjsonCodec
 
 # ============================================================================
 # Demo Mode Configuration
@@ -26,6 +39,10 @@ from bed_registery import BedRegistry
 # Set to True to automatically reset database on startup with demo data
 DEMO_MODE = True
 
+# Set to True to also send per-change events (patient:updated, bed:updated, ...)
+# alongside the batched state:delta, for clients that don't handle state:delta
+LEGACY_SOCKET_EVENTS = False
+
 # ============================================================================
 # Initialize FastAPI and Socket.IO
 # ============================================================================
@@ -36,19 +53,48 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS - Allow frontend to connect
+# CORS - only needed when the frontend is served from another origin (e.g. a
+# dev server); the bundled frontend below is same-origin. FRONTEND_ORIGIN
+# takes a comma-separated list.
+FRONTEND_ORIGINS = [
+    o.strip() for o in os.getenv("FRONTEND_ORIGIN", "http://localhost:5173").split(",") if o.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for development
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH"],
+    allow_headers=["Content-Type"],
 )
 
+
+class WriteScopeMiddleware:
+    """
+    Open a storage_worker write scope per HTTP request, so a handler's
+    wait_flush() waits on (and reports failures of) that request's writes only.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            storage_worker.track()
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(WriteScopeMiddleware)
+
+# Set REDIS_URL to fan emits out through Redis (needs the `redis` package),
+# e.g. for an external emitter. It doesn't make several server workers safe:
+# patient/bed state is per process (see the __main__ block)
+REDIS_URL = os.getenv("REDIS_URL")
+
 # Socket.IO server for real-time updates
 sio = socketio.AsyncServer(
     async_mode='asgi',
-    cors_allowed_origins='*'
+    cors_allowed_origins='*',
+    json=OrjsonCodec,
+    client_manager=socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
 )
 socket_app = socketio.ASGIApp(sio, app)
 
@@ -56,16 +102,39 @@ socket_app = socketio.ASGIApp(sio, app)
 # Global State (In-Memory for now)
 # ============================================================================
 
-smart_queue = SmartQueue(department="ED")
-bed_registry = BedRegistry()
+# Patient and bed writes go through a background thread so commits never
+# block the event loop
+storage_worker = StorageWorker(DB_PATH)
+smart_queue = SmartQueue(department="ED", store=SQLitePatientStore(writer=storage_worker))
+bed_registry = BedRegistry(SQLiteBedStore(writer=storage_worker))
+
+# Connect-time state snapshot, rebuilt only after a mutation
+snapshot_cache = SnapshotCache(smart_queue, bed_registry)
+
+# Broadcasts are coalesced into periodic state:delta emits
+emit_batcher = EmitBatcher(sio, legacy_events=LEGACY_SOCKET_EVENTS)
+
+# Handlers are all `async def`. SmartQueue works in memory and only queues its
+# writes, so it's called directly on the event loop; bed queries still read
+# SQLite and are pushed to the threadpool with run_in_threadpool. Handlers
+# await storage_worker.wait_flush() before responding, so a returned change is
+# committed without the commit ever blocking the loop. If SQLite rejected one
+# of the request's writes, wait_flush() raises and the request fails with 500.
+
+@app.exception_handler(StorageWriteError)
+async def storage_write_error(request, exc: StorageWriteError):
+    return JSONResponse(status_code=500, content={"detail": f"Database write failed: {exc}"})
 
 # ============================================================================
 # Pydantic Models (Request/Response schemas)
 # ============================================================================
 
+# Bed feature names are stored "|"-delimited, so reject ones that can't round-trip
+FeatureName = Annotated[str, AfterValidator(check_feature_name)]
+
 class PatientCreate(BaseModel):
     name: str
-    esi: int  # 1-5
+    esi: int = Field(ge=ESI_MIN, le=ESI_MAX)
     chief_complaint: str
     age: int
     gender: str
@@ -80,7 +149,7 @@ class BedAssignment(BaseModel):
 class BedCreate(BaseModel):
     bed_type: str
     section: str
-    features: List[str] = []
+    features: List[FeatureName] = []
 
 # ============================================================================
 # Startup Event - Demo Mode
@@ -89,6 +158,8 @@ class BedCreate(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """Initialize demo data if DEMO_MODE is enabled"""
+    emit_batcher.start()
+
     if DEMO_MODE:
         print("\n" + "=" * 60)
         print("DEMO MODE ENABLED")
@@ -111,64 +182,65 @@ async def startup_event():
         print("Demo data loaded successfully!")
         print("=" * 60 + "\n")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Send pending broadcasts and commit any queued bed writes before exiting"""
+    await emit_batcher.stop()
+    await asyncio.to_thread(storage_worker.close)
+
 # ============================================================================
 # REST API Endpoints - Patients
 # ============================================================================
 
 # Root route removed to allow StaticFiles to serve frontend at "/"
-# API status available at other endpoints like /api/patients, /api/beds
+# API status available at /api (and other endpoints like /api/patients, /api/beds)
+
+@app.get("/api")
+async def root():
+    """Lightweight status/health check with patient and bed counts"""
+    return {
+        "status": "ok",
+        "patients": smart_queue.count_patients(),
+        "beds": await run_in_threadpool(bed_registry.count_beds),
+    }
 
 @app.get("/api/patients")
-def get_all_patients():
+async def get_all_patients():
     """Get all active patients"""
     return smart_queue.get_all_active_patients()
 
 @app.get("/queue")
-def get_queue(department: str = "ED"):
+async def get_queue(department: str = "ED"):
     """Get waiting room patients (REGISTERED, AWAITING_TRIAGE, TRIAGED)"""
-    waiting_room_statuses = ["REGISTERED", "AWAITING_TRIAGE", "TRIAGED"]
-
-    waiting_patients = []
-    for status in waiting_room_statuses:
-        patients = smart_queue.get_patients_by_status(status)
-        waiting_patients.extend(patients)
-
-    # Sort by ESI priority (lower is higher priority), then arrival time
-    waiting_patients.sort(key=lambda p: (p['esi'], p['arrival_ts']))
-
-    return waiting_patients
+    # Sorted by ESI priority (lower is higher priority), then arrival time
+    return smart_queue.get_waiting_room_patients()
 
 @app.get("/patients_db")
-def get_patients_database(department: str = "ED"):
+async def get_patients_database(department: str = "ED"):
     """Get ALL patients from database (including discharged/admitted)"""
-    all_patients = list(smart_queue._patients.values())
-    # Filter by department
-    dept_patients = [p for p in all_patients if p.department == department]
-    # Sort by arrival time (most recent first)
-    dept_patients.sort(key=lambda p: p.arrival_ts, reverse=True)
-    return [p.to_dict() for p in dept_patients]
+    # Filtered by department, most recent arrival first
+    return smart_queue.get_patients_by_arrival(department)
 
 @app.get("/api/patients/delayed")
-def get_delayed_patients():
+async def get_delayed_patients():
     """Get patients exceeding ESI wait thresholds"""
     return smart_queue.get_delayed_patients()
 
 @app.get("/api/patients/status/{status}")
-def get_patients_by_status(status: str):
+async def get_patients_by_status(status: str):
     """Get patients by status (e.g., AWAITING_TRIAGE, IN_BED)"""
     return smart_queue.get_patients_by_status(status)
 
 @app.get("/api/patients/{patient_id}")
-def get_patient(patient_id: str):
+async def get_patient(patient_id: str):
     """Get single patient details"""
     patient = smart_queue.get(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient.to_dict()
 
-@app.post("/api/patients")
-async def create_patient(patient: PatientCreate):
-    """Register a new patient"""
+async def _create_patient_impl(patient: PatientCreate) -> dict:
+    """Register the (already validated) patient, broadcast it, return it"""
     patient_id = smart_queue.add_patient(
         name=patient.name,
         esi=patient.esi,
@@ -177,55 +249,51 @@ async def create_patient(patient: PatientCreate):
         gender=patient.gender,
         notes=patient.notes or ""
     )
+    await storage_worker.wait_flush()
 
     patient_data = smart_queue.get(patient_id).to_dict()
 
     # Broadcast to all connected clients
-    await sio.emit('patient:created', patient_data)
+    emit_batcher.push('patient:created', patient_data)
 
     return patient_data
 
-@app.patch("/api/patients/{patient_id}/status")
-async def update_patient_status(patient_id: str, data: PatientStatusUpdate, department: str = "ED"):
-    """Update patient status"""
+@app.post("/api/patients")
+async def create_patient(patient: PatientCreate):
+    """Register a new patient"""
+    return await _create_patient_impl(patient)
+
+async def _do_status_update(patient_id: str, new_status: str) -> dict:
+    """Validate and apply a status change, broadcast it, return the patient"""
     patient = smart_queue.get(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Validate: Cannot set status to IN_BED without a bed assignment
-    if data.new_status == "IN_BED" and not patient.bed_id:
+    if new_status == "IN_BED" and not patient.bed_id:
         raise HTTPException(
             status_code=400,
             detail="Cannot set status to IN_BED: Patient must be assigned a bed first. Use 'Assign bed' button."
         )
 
-    smart_queue.update_status(patient_id, data.new_status)
+    smart_queue.update_status(patient_id, new_status)
+    await storage_worker.wait_flush()
     patient_data = patient.to_dict()
 
     # Broadcast update
-    await sio.emit('patient:updated', patient_data)
+    emit_batcher.push('patient:updated', patient_data)
 
     return patient_data
 
+@app.patch("/api/patients/{patient_id}/status")
+async def update_patient_status(patient_id: str, data: PatientStatusUpdate, department: str = "ED"):
+    """Update patient status"""
+    return await _do_status_update(patient_id, data.new_status)
+
 @app.patch("/patients/{patient_id}/status")
 async def update_patient_status_compat(patient_id: str, status: str, department: str = "ED"):
     """Update patient status (frontend compatibility - accepts status as query param)"""
-    patient = smart_queue.get(patient_id)
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-
-    # Validate: Cannot set status to IN_BED without a bed assignment
-    if status == "IN_BED" and not patient.bed_id:
-        raise HTTPException(
-            status_code=400,
-            detail="Cannot set status to IN_BED: Patient must be assigned a bed first. Use 'Assign bed' button."
-        )
-
-    smart_queue.update_status(patient_id, status)
-    patient_data = patient.to_dict()
-
-    await sio.emit('patient:updated', patient_data)
-    return patient_data
+    return await _do_status_update(patient_id, status)
 
 @app.patch("/api/patients/{patient_id}/bed")
 async def assign_bed_to_patient(patient_id: str, data: BedAssignment):
@@ -234,20 +302,20 @@ async def assign_bed_to_patient(patient_id: str, data: BedAssignment):
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    bed = bed_registry.get(data.bed_id)
+    # Assign bed (BedRegistry updates bed, SmartQueue updates patient).
+    # occupy_bed returns the updated bed, or None if it doesn't exist.
+    bed = await run_in_threadpool(bed_registry.occupy_bed, data.bed_id, patient_id)
     if not bed:
         raise HTTPException(status_code=404, detail="Bed not found")
-
-    # Assign bed (SmartQueue updates patient, BedRegistry updates bed)
     smart_queue.assign_bed(patient_id, data.bed_id)
-    bed_registry.occupy_bed(data.bed_id, patient_id)
+    await storage_worker.wait_flush()
 
     patient_data = patient.to_dict()
-    bed_data = bed_registry.get(data.bed_id).to_dict()
+    bed_data = bed.to_dict()
 
     # Broadcast both updates
-    await sio.emit('patient:updated', patient_data)
-    await sio.emit('bed:updated', bed_data)
+    emit_batcher.push('patient:updated', patient_data)
+    emit_batcher.push('bed:updated', bed_data)
 
     return patient_data
 
@@ -256,19 +324,17 @@ async def assign_bed_to_patient(patient_id: str, data: BedAssignment):
 # ============================================================================
 
 @app.get("/api/beds")
-def get_all_beds(status: Optional[str] = None):
+@app.get("/beds")  # frontend compatibility
+async def get_all_beds(status: Optional[str] = None):
     """Get all beds, optionally filter by status"""
-    return bed_registry.list_beds(status=status)
-
-@app.get("/beds")
-def get_beds_compat(status: Optional[str] = None):
-    """Get all beds (frontend compatibility)"""
-    return bed_registry.list_beds(status=status)
+    # Pre-encoded and cached until the next bed change, so polling is cheap
+    body = await run_in_threadpool(bed_registry.list_beds_json, status=status)
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/beds/{bed_id}")
-def get_bed(bed_id: str):
+async def get_bed(bed_id: str):
     """Get single bed details"""
-    bed = bed_registry.get(bed_id)
+    bed = await run_in_threadpool(bed_registry.get, bed_id)
     if not bed:
         raise HTTPException(status_code=404, detail="Bed not found")
     return bed.to_dict()
@@ -276,31 +342,33 @@ def get_bed(bed_id: str):
 @app.post("/api/beds")
 async def create_bed(bed: BedCreate):
     """Add a new bed to inventory"""
-    bed_id = bed_registry.add_bed(
+    new_bed = await run_in_threadpool(
+        bed_registry.create_bed,
         bed_type=bed.bed_type,
         section=bed.section,
         features=bed.features
     )
+    await storage_worker.wait_flush()
 
-    bed_data = bed_registry.get(bed_id).to_dict()
+    bed_data = new_bed.to_dict()
 
     # Broadcast new bed
-    await sio.emit('bed:created', bed_data)
+    emit_batcher.push('bed:created', bed_data)
 
     return bed_data
 
 @app.patch("/api/beds/{bed_id}/free")
 async def free_bed(bed_id: str):
     """Mark bed as available (free it)"""
-    bed = bed_registry.get(bed_id)
+    bed = await run_in_threadpool(bed_registry.free_bed, bed_id)
     if not bed:
         raise HTTPException(status_code=404, detail="Bed not found")
 
-    bed_registry.free_bed(bed_id)
-    bed_data = bed_registry.get(bed_id).to_dict()
+    await storage_worker.wait_flush()
+    bed_data = bed.to_dict()
 
     # Broadcast update
-    await sio.emit('bed:updated', bed_data)
+    emit_batcher.push('bed:updated', bed_data)
 
     return bed_data
 
@@ -312,39 +380,38 @@ class AssignBestBedRequest(BaseModel):
     patient_id: str
     needed_bed_type: Optional[str] = None
     needed_section: Optional[str] = None
-    required_features: List[str] = []
+    required_features: List[FeatureName] = []
 
 @app.post("/beds/assign_best")
 async def assign_best_bed(payload: AssignBestBedRequest):
     """Assign best available bed to patient"""
-    bed_id = bed_registry.assign_best_available(
+    # assign_best_match returns the updated bed, so no re-read is needed
+    bed = await run_in_threadpool(
+        bed_registry.assign_best_match,
         patient_id=payload.patient_id,
         needed_bed_type=payload.needed_bed_type,
         needed_section=payload.needed_section,
         required_features=payload.required_features
     )
 
-    if not bed_id:
-        raise HTTPException(status_code=404, detail="No matching open bed found")
-
-    bed = bed_registry.get(bed_id)
     if not bed:
-        raise HTTPException(status_code=500, detail="Assigned bed not found")
+        raise HTTPException(status_code=404, detail="No matching open bed found")
 
     # Also update patient's bed_id in SmartQueue
-    smart_queue.assign_bed(payload.patient_id, bed_id)
+    smart_queue.assign_bed(payload.patient_id, bed.id)
+    await storage_worker.wait_flush()
 
     bed_data = bed.to_dict()
     patient_data = smart_queue.get(payload.patient_id).to_dict()
 
     # Broadcast both updates
-    await sio.emit('bed:updated', bed_data)
-    await sio.emit('patient:updated', patient_data)
+    emit_batcher.push('bed:updated', bed_data)
+    emit_batcher.push('patient:updated', patient_data)
 
     return bed_data
 
 @app.get("/eta/{patient_id}")
-def estimate_eta(
+async def estimate_eta(
     patient_id: str,
     department: str = "ED",
     rooms_available: int = 1,
@@ -355,16 +422,12 @@ def estimate_eta(
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    # Count patients in waiting room (REGISTERED, AWAITING_TRIAGE, TRIAGED) who are ahead
-    # These are patients waiting for bed assignment
-    waiting_room_statuses = ["REGISTERED", "AWAITING_TRIAGE", "TRIAGED"]
-
+    # Count patients in waiting room (REGISTERED, AWAITING_TRIAGE, TRIAGED) who are ahead:
+    # higher priority (lower ESI) or same ESI but earlier arrival.
+    # These are patients waiting for bed assignment.
     patients_ahead = 0
-    for p in smart_queue._patients.values():
-        if p.status in waiting_room_statuses and p.department == department:
-            # Higher priority (lower ESI) or same ESI but earlier arrival
-            if p.esi < patient.esi or (p.esi == patient.esi and p.arrival_ts < patient.arrival_ts):
-                patients_ahead += 1
+    if department == smart_queue.department:
+        patients_ahead = smart_queue.count_ahead(patient)
 
     eta_minutes = (patients_ahead / max(1, rooms_available)) * avg_service_min
 
@@ -384,20 +447,22 @@ async def discharge_patient(patient_id: str, department: str = "ED"):
     smart_queue.update_status(patient_id, "DISCHARGED")
 
     # If patient has a bed, free it
+    bed = None
     if patient.bed_id:
-        bed_registry.free_bed(patient.bed_id)
-        bed_data = bed_registry.get(patient.bed_id).to_dict()
-        await sio.emit('bed:updated', bed_data)
+        bed = await run_in_threadpool(bed_registry.free_bed, patient.bed_id)
+    await storage_worker.wait_flush()
+    if bed:
+        emit_batcher.push('bed:updated', bed.to_dict())
 
     patient_data = patient.to_dict()
-    await sio.emit('patient:updated', patient_data)
+    emit_batcher.push('patient:updated', patient_data)
 
     return patient_data
 
 @app.post("/patients")
 async def create_patient_compat(patient: PatientCreate):
     """Create patient (frontend compatibility - no /api prefix)"""
-    return await create_patient(patient)
+    return await _create_patient_impl(patient)
 
 # ============================================================================
 # Static Files - Serve Frontend
@@ -414,13 +479,12 @@ if frontend_path.exists():
 
 @sio.event
 async def connect(sid, environ):
-    """Client connected - send full state snapshot"""
+    """Client connected - send state snapshot (only changes if it passed ?since=<cursor>)"""
     print(f"[OK] Client connected: {sid}")
 
-    await sio.emit('state:snapshot', {
-        'patients': smart_queue.get_all_active_patients(),
-        'beds': bed_registry.list_beds()
-    }, to=sid)
+    since = parse_qs(environ.get('QUERY_STRING', '')).get('since', [None])[0]
+    snapshot = await run_in_threadpool(snapshot_cache.for_client, since)
+    await sio.emit('state:snapshot', snapshot, to=sid)
 
 @sio.event
 def disconnect(sid):
@@ -442,8 +506,14 @@ async def update_patient_status_ws(sid, data):
         await sio.emit('error', {'message': 'Patient not found'}, to=sid)
         return
 
+    storage_worker.track()
     smart_queue.update_status(patient_id, new_status)
-    await sio.emit('patient:updated', patient.to_dict())
+    try:
+        await storage_worker.wait_flush()
+    except StorageWriteError as exc:
+        await sio.emit('error', {'message': f'Database write failed: {exc}'}, to=sid)
+        return
+    emit_batcher.push('patient:updated', patient.to_dict())
 
 # ============================================================================
 # Run Server
@@ -451,7 +521,24 @@ async def update_patient_status_ws(sid, data):
 
 if __name__ == "__main__":
     import uvicorn
+
+    # Development default: single process with auto-reload.
+    # Production: RELOAD=0 (uvloop + httptools, no reloader).
+    reload = os.getenv("RELOAD", "1") == "1"
+    port = int(os.getenv("PORT", "8000"))
+
+    # One process only. SmartQueue's indexes, BedRegistry's version /
+    # change log / list cache, and the connect snapshot all live in process
+    # memory; REDIS_URL shares emits but not that state, so a second worker
+    # would serve stale beds and deltas (and re-seed the demo data).
+    if int(os.getenv("WORKERS", "1")) > 1:
+        sys.exit(
+            "WORKERS > 1 is not supported: patient/bed state is kept in process "
+            "memory and isn't shared between workers. Run a single worker."
+        )
+
     print("Starting ER Flow Dashboard Backend...")
-    print("API Docs: http://localhost:8000/docs")
-    print("WebSocket: ws://localhost:8000/socket.io/")
-    uvicorn.run("main:socket_app", host="0.0.0.0", port=8000, reload=True)
+    print(f"API Docs: http://localhost:{port}/docs")
+    print(f"WebSocket: ws://localhost:{port}/socket.io/")
+    options = {} if reload else {"loop": "uvloop", "http": "httptools"}
+    uvicorn.run("main:socket_app", host="0.0.0.0", port=port, reload=reload, **options)
@@ -0,0 +1,123 @@
+# snapshot_cache.py
+"""
+Cached `state:snapshot` payload for Socket.IO connects.
+
+Every new dashboard client gets the full patient + bed state on connect.
+Rebuilding that per client means a list_beds query and a to_dict() per
+patient and bed each time; with many observers connecting at once the
+same snapshot gets built over and over. SnapshotCache builds it once and
+reuses it until SmartQueue or BedRegistry reports a mutation (via their
+`version` counters). The orjson-encoded form is cached too, so repeat
+connects skip JSON encoding as well.
+
+Every snapshot carries a `cursor`. A client that reconnects with
+`?since=<cursor>` gets a partial snapshot instead: only the patients and
+beds changed since then, flagged `"partial": true`. Cursors from another
+server process (or too old to answer) fall back to the full snapshot.
+"""
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from smart_queue import SmartQueue
+from bed_registery import BedRegistry
+from socket_codec import PreEncoded, encode
+
+# Patient dicts carry minute-resolution wait times, so don't serve a
+# snapshot older than this even if nothing changed.
+MAX_AGE_SECONDS = 15.0
+
+# Distinguishes cursors issued by this process from a previous run's
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def make_cursor(versions: Tuple[int, int]) -> str:
+    return f"{BOOT_ID}.{versions[0]}.{versions[1]}"
+
+
+def parse_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    """(patient_version, bed_version) from a cursor of this process, else None"""
+    try:
+        boot_id, patient_version, bed_version = cursor.split(".")
+        if boot_id != BOOT_ID:
+            return None
+        return (int(patient_version), int(bed_version))
+    except ValueError:
+        return None
+
+
+class SnapshotCache:
+    """Lazily built, version-checked snapshot of patients + beds."""
+
+    def __init__(
+        self,
+        smart_queue: SmartQueue,
+        bed_registry: BedRegistry,
+        max_age: float = MAX_AGE_SECONDS,
+    ):
+        self.smart_queue = smart_queue
+        self.bed_registry = bed_registry
+        self.max_age = max_age
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._encoded: Optional[PreEncoded] = None
+        self._versions: Tuple[int, int] = (-1, -1)
+        self._built_at = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        """Return the current snapshot, rebuilding it only if stale"""
+        versions = (self.smart_queue.version, self.bed_registry.version)
+        now = time.monotonic()
+        if (
+            self._snapshot is None
+            or versions != self._versions
+            or now - self._built_at > self.max_age
+        ):
+            self._snapshot = {
+                'patients': self.smart_queue.get_all_active_patients(),
+                'beds': self.bed_registry.list_beds(),
+                'cursor': make_cursor(versions),
+            }
+            self._encoded = None
+            self._versions = versions
+            self._built_at = now
+        return self._snapshot
+
+    def get_encoded(self) -> PreEncoded:
+        """The current snapshot, serialized once for emitting"""
+        snapshot = self.get()
+        encoded = self._encoded
+        if encoded is None:
+            encoded = self._encoded = encode(snapshot)
+        return encoded
+
+    def for_client(self, since: Optional[str] = None) -> PreEncoded:
+        """
+        Encoded payload for a connecting client: changes since `since`
+        when that cursor can be answered, else the full snapshot.
+        """
+        versions = parse_cursor(since) if since else None
+        if versions is not None:
+            delta = self._delta(*versions)
+            if delta is not None:
+                return encode(delta)
+        return self.get_encoded()
+
+    def _delta(self, patient_version: int, bed_version: int) -> Optional[Dict[str, Any]]:
+        # Read the versions first: anything changing while we collect is
+        # at worst sent again next time, never skipped
+        cursor = make_cursor((self.smart_queue.version, self.bed_registry.version))
+        patients = self.smart_queue.changed_since(patient_version)
+        bed_ids = self.bed_registry.changed_since(bed_version)
+        if patients is None or bed_ids is None:
+            return None
+        return {
+            'partial': True,
+            'patients': [p.to_dict() for p in patients],
+            'beds': self.bed_registry.get_many_as_dicts(bed_ids),
+            'cursor': cursor,
+        }
+
+    def invalidate(self) -> None:
+        """Force a rebuild on the next get()"""
+        self._snapshot = None
+        self._encoded = None
@@ -0,0 +1,47 @@
+# socket_codec.py
+"""
+orjson-backed JSON codec for python-socketio.
+
+python-socketio builds a broadcast packet once and reuses it for every
+recipient, but before encoding it walks the whole payload looking for
+binary attachments, and then encodes it with the `json` module it was given.
+For the large payloads (connect snapshot, state:delta batches) both passes
+are pure-Python overhead that scales with state size.
+
+`encode()` serializes a payload once with orjson and returns it as a
+PreEncoded string. Socket.IO sees only a str (so the binary scan is O(1)),
+and OrjsonCodec splices the JSON text into the packet verbatim.
+"""
+from typing import Any
+
+import orjson
+
+
+class PreEncoded(str):
+    """JSON text that OrjsonCodec emits as-is instead of as a string"""
+
+
+def encode(obj: Any) -> PreEncoded:
+    """Serialize `obj` once so it can be emitted (and re-emitted) cheaply"""
+    return PreEncoded(orjson.dumps(obj).decode())
+
+
+class OrjsonCodec:
+    """
+    Drop-in for the stdlib json module so Socket.IO packets are encoded
+    with orjson. python-socketio passes stdlib-style kwargs (separators=...),
+    which orjson's compact output already satisfies.
+    """
+    @staticmethod
+    def dumps(obj, *args, **kwargs) -> str:
+        # Event packets are [event_name, *args]; splice pre-encoded args in
+        if isinstance(obj, list) and any(isinstance(o, PreEncoded) for o in obj):
+            return "[" + ",".join(
+                o if isinstance(o, PreEncoded) else orjson.dumps(o).decode()
+                for o in obj
+            ) + "]"
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
@@ -589,9 +589,25 @@ socket.on("connect", () => {
 });
 
 // Listen for initial state snapshot
-socket.on("state:snapshot", (data) => {
+socket.on("state:snapshot", async (data) => {
   console.log("Received state snapshot:", data);
-  // Initial load happens below, so we can skip this or use it for faster initial render
+  // Reconnects ask only for what changed since this snapshot
+  if (data.cursor) {
+    socket.io.opts.query = { since: data.cursor };
+  }
+  // Initial load happens below, so a full snapshot can be skipped; a partial
+  // one (after a reconnect) lists what was missed while disconnected
+  if (data.partial) {
+    if (data.beds.length) {
+      await loadBeds();
+    }
+    if (data.patients.length || data.beds.length) {
+      await loadQueue();
+    }
+    if (data.patients.length) {
+      await loadPatientsDb();
+    }
+  }
 });
 
 // Listen for patient updates
@@ -619,6 +635,25 @@ socket.on("bed:created", async (bed) => {
   await loadBeds();
 });
 
+// Batched updates: { "patient:updated": [...], "bed:updated": [...], ... }
+// The server coalesces bursts of changes into one delta, so reload each
+// affected view once per delta instead of once per change.
+socket.on("state:delta", async (delta) => {
+  console.log("Received state delta:", delta);
+  const patientsChanged = Boolean(delta["patient:created"] || delta["patient:updated"]);
+  const bedsChanged = Boolean(delta["bed:created"] || delta["bed:updated"]);
+
+  if (bedsChanged) {
+    await loadBeds();
+  }
+  if (patientsChanged || delta["bed:updated"]) {
+    await loadQueue();
+  }
+  if (patientsChanged) {
+    await loadPatientsDb();
+  }
+});
+
 socket.on("disconnect", () => {
   console.log("WebSocket disconnected");
 });
@@ -35,14 +35,17 @@ def list_patients_db(
 @router.post("/patients", response_model=PatientRead)
 def add_patient(payload: PatientCreate):
     sq = get_queue(payload.department)
-    pid = sq.add_patient(
-        name=payload.name,
-        esi=payload.esi,
-        chief_complaint=payload.chief_complaint,
-        age=payload.age,
-        gender=payload.gender,
-        notes=payload.notes or "",
-    )
+    try:
+        pid = sq.add_patient(
+            name=payload.name,
+            esi=payload.esi,
+            chief_complaint=payload.chief_complaint,
+            age=payload.age,
+            gender=payload.gender,
+            notes=payload.notes or "",
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
     return sq.get(pid).to_dict()
 
 # ---------- Get queue snapshot ----------
@@ -65,7 +68,10 @@ def update_patient_esi(patient_id: str, payload: UpdateESI, department: str = Qu
     sq = get_queue(department)
     if not sq.get(patient_id):
         raise HTTPException(status_code=404, detail="Patient not found")
-    sq.update_esi(patient_id, payload.esi)
+    try:
+        sq.update_esi(patient_id, payload.esi)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
     return sq.get(patient_id).to_dict()
 
 # ---------- Update Status ----------
@@ -153,17 +159,13 @@ def list_beds(status: Optional[str] = None):
 # ---------- Beds: assign best ----------
 @router.post("/beds/assign_best", response_model=BedRead)
 def assign_best_bed(payload: AssignBestBedRequest):
-    bed_id = bed_registry.assign_best_available(
+    bed = bed_registry.assign_best_match(
         patient_id=payload.patient_id,
         needed_bed_type=payload.needed_bed_type,
         needed_section=payload.needed_section,
         required_features=payload.required_features,
     )
-    if not bed_id:
-        raise HTTPException(status_code=404, detail="No matching open bed")
-
-    bed = bed_registry.get(bed_id)
     if not bed:
-        raise HTTPException(status_code=500, detail="Assigned bed not found")
+        raise HTTPException(status_code=404, detail="No matching open bed")
 
     return BedRead.from_bed(bed)
\ No newline at end of file
@@ -1,25 +1,91 @@
 # bed.py
-from dataclasses import dataclass, field, asdict
-from typing import Optional, Set
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Optional
 from uuid import uuid4
 
-@dataclass
+# Allowed values of Bed.status (mirrors the CHECK constraint in bed_db.py)
+BED_STATUSES = frozenset({"OPEN", "HELD", "OCCUPIED"})
+
+# Delimits names in the encoded features column (see bed_db.encode_features),
+# so it can't appear inside a name
+FEATURE_SEPARATOR = "|"
+
+
+def check_feature_name(name: str) -> str:
+    """
+    Return `name` if it can be stored as a bed feature, else raise
+    ValueError: it must be a non-empty string without FEATURE_SEPARATOR.
+    """
+    if not isinstance(name, str) or not name or FEATURE_SEPARATOR in name:
+        raise ValueError(
+            f"Invalid bed feature {name!r}: must be non-empty and not contain {FEATURE_SEPARATOR!r}"
+        )
+    return name
+
+
+@lru_cache(maxsize=256)
+def _shared(features: FrozenSet[str]) -> FrozenSet[str]:
+    # Returns the first equal set seen, so beds share one object per combination.
+    # Validated here so each distinct set is checked once (errors aren't cached).
+    for name in features:
+        check_feature_name(name)
+    return features
+
+
+def feature_set(features: Iterable[str]) -> FrozenSet[str]:
+    """
+    Features as an immutable set, shared between beds with the same ones
+    (a ward typically has just a few distinct combinations). Raises
+    ValueError for a name check_feature_name() rejects.
+    """
+    if not isinstance(features, frozenset):
+        features = frozenset(features)
+    return _shared(features)
+
+@dataclass(slots=True)
 class Bed:
     """
     A physical care location that can be assigned to a patient.
     bed_type: logical capability (e.g., 'ED', 'ICU', 'OR', 'PEDS', 'ISOLATION', 'POSTOP')
     section: physical wing/zone, e.g., 'A3', 'ED-North', 'OR-2'
     features: optional set like {'negative_pressure', 'cardiac_monitor'}
+              (stored as a shared frozenset, see feature_set())
     status: 'OPEN' | 'HELD' | 'OCCUPIED'
     """
     bed_type: str
     section: str
-    features: Set[str] = field(default_factory=set)
+    features: FrozenSet[str] = field(default_factory=frozenset)
     status: str = "OPEN"
     id: str = field(default_factory=lambda: str(uuid4()))
     patient_id: Optional[str] = None
 
+    # Memoized to_dict() output; not part of the bed's identity. Declared as
+    # a field so slots=True reserves a slot for it (set by __setattr__).
+    _cached_dict: Optional[dict] = field(init=False, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        if name == "features":
+            value = feature_set(value)
+        # Any field assignment invalidates the cached to_dict() output
+        object.__setattr__(self, name, value)
+        if name != "_cached_dict":
+            object.__setattr__(self, "_cached_dict", None)
+
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d["features"] = sorted(list(self.features))
+        """
+        JSON-ready dict, built by hand (asdict deep-copies every field) and
+        memoized until the next field assignment. Treat it as read-only.
+        """
+        d = self._cached_dict
+        if d is None:
+            d = {
+                "bed_type": self.bed_type,
+                "section": self.section,
+                "features": sorted(self.features),
+                "status": self.status,
+                "id": self.id,
+                "patient_id": self.patient_id,
+            }
+            object.__setattr__(self, "_cached_dict", d)
         return d
@@ -7,15 +7,177 @@ The actual .db file will be created automatically the first time
 you import and use SQLiteBedStore.
 """
 
-import json
 import sqlite3
-from typing import Iterable, List, Optional, Set
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
-from bed import Bed
+import orjson
+
+from bed import Bed, feature_set
+from db_pool import ConnectionPool
+
+if TYPE_CHECKING:
+    from storage_worker import StorageWorker
 
 # Use same database as the rest of the application
 DB_PATH = "hospital_flow.db"
 
+_GET_SQL = "SELECT * FROM beds WHERE id = ?"
+_GET_BY_PATIENT_SQL = "SELECT * FROM beds WHERE patient_id = ? LIMIT 1"
+# A bed plus whatever bed the patient holds now, in one indexed lookup
+_GET_WITH_PATIENT_BED_SQL = "SELECT * FROM beds WHERE id = ? OR patient_id = ?"
+_GET_PAIR_SQL = "SELECT * FROM beds WHERE id IN (?, ?)"
+
+_INSERT_SQL = """
+    INSERT INTO beds (id, bed_type, section, features, status, patient_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Generates beds <prefix>1..<prefix>N inside SQLite. Ids are random
+# version-4 UUID strings, same format as Bed's default uuid4() ids.
+_INSERT_SERIES_SQL = """
+    WITH RECURSIVE seq(n) AS (
+        SELECT 1
+        UNION ALL
+        SELECT n + 1 FROM seq WHERE n < ?
+    )
+    INSERT INTO beds (id, bed_type, section, features, status, patient_id)
+    SELECT
+        lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' ||
+        substr(lower(hex(randomblob(2))), 2) || '-' ||
+        substr('89ab', 1 + (abs(random()) % 4), 1) ||
+        substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6))),
+        ?, ? || n, ?, 'OPEN', NULL
+    FROM seq
+    ORDER BY n
+"""
+
+# Columns for the dict-returning queries, in the order _rows_to_dicts unpacks
+_DICT_COLUMNS = "id, bed_type, section, features, status, patient_id"
+
+# The whole list_beds_as_dicts() result as one JSON array, built by SQLite
+# (same keys and order as Bed.to_dict()). features goes "|a|b|" -> ["a","b"]:
+# json_quote escapes the names, and never touches the "|" separators.
+_JSON_ARRAY_COLUMNS = """json_group_array(json_object(
+    'bed_type', bed_type,
+    'section', section,
+    'features', CASE features WHEN '' THEN json('[]') ELSE json(
+        '[' || replace(json_quote(substr(features, 2, length(features) - 2)), '|', '","') || ']'
+    ) END,
+    'status', status,
+    'id', id,
+    'patient_id', patient_id
+))"""
+
+# One constant statement for any number of ids: they're bound as a single
+# JSON array and expanded by json_each, then matched against the primary key
+_GET_MANY_DICTS_SQL = (
+    f"SELECT {_DICT_COLUMNS} FROM beds WHERE id IN (SELECT value FROM json_each(?))"
+)
+
+_UPDATE_SQL = """
+    UPDATE beds
+    SET bed_type = ?, section = ?, features = ?, status = ?, patient_id = ?
+    WHERE id = ?
+"""
+
+# Status changes only touch these two columns
+_SET_STATUS_SQL = "UPDATE beds SET status = ?, patient_id = ? WHERE id = ?"
+
+# Both halves of a swap in one statement
+_SET_STATUS_PAIR_SQL = """
+    UPDATE beds
+    SET status = CASE id WHEN ? THEN ? ELSE ? END,
+        patient_id = CASE id WHEN ? THEN ? ELSE ? END
+    WHERE id IN (?, ?)
+"""
+
+
+@lru_cache(maxsize=None)
+def _list_sql(columns: str, by_status: bool, by_type: bool, by_section: bool) -> str:
+    """
+    SQL text for one combination of list filters.
+
+    There are only 8 combinations per column list; returning the identical
+    string each time lets the connection's statement cache reuse the
+    prepared statement instead of re-parsing a freshly concatenated query.
+    """
+    query = f"SELECT {columns} FROM beds WHERE 1=1"
+    if by_status:
+        query += " AND status = ?"
+    if by_type:
+        query += " AND bed_type = ?"
+    if by_section:
+        query += " AND section = ?"
+    return query
+
+
+@lru_cache(maxsize=64)
+def _find_open_sql(by_type: bool, by_section: bool, n_features: int) -> str:
+    """
+    SQL text for find_open_bed() with the given filters, built once per shape
+    (same statement-cache reasoning as _list_sql).
+    """
+    query = "SELECT * FROM beds WHERE status = 'OPEN'"
+    if by_type:
+        query += " AND bed_type = ?"
+    if by_section:
+        query += " AND section = ?"
+    # Each required feature must appear as "|name|" in the encoded column.
+    # instr() is an exact substring test ('_' is a LIKE wildcard).
+    query += " AND instr(features, ?) > 0" * n_features
+    # Deterministic pick: lowest section first. SQLite stops at the first row.
+    return query + " ORDER BY section LIMIT 1"
+
+
+@lru_cache(maxsize=64)
+def _find_open_with_patient_sql(by_type: bool, by_section: bool, n_features: int) -> str:
+    """
+    find_open_bed()'s query plus the patient's current bed, as one compound
+    SELECT. The leading is_current column tells the two rows apart.
+    """
+    return (
+        f"SELECT 0 AS is_current, * FROM ({_find_open_sql(by_type, by_section, n_features)}) "
+        f"UNION ALL SELECT 1, * FROM ({_GET_BY_PATIENT_SQL})"
+    )
+
+
+def encode_features(features: Iterable[str]) -> str:
+    """
+    Canonical column form of a feature set: "|a|b|" (sorted), "" if empty.
+
+    The sentinel pipes let SQL match a single feature with
+    instr(features, '|name|') > 0 without hitting substrings of other
+    names (an exact substring test, unlike LIKE where '_' is a wildcard).
+    """
+    feats = sorted(features)
+    if not feats:
+        return ""
+    return "|" + "|".join(feats) + "|"
+
+
+@lru_cache(maxsize=256)
+def decode_features(raw: Optional[str]) -> FrozenSet[str]:
+    """
+    Inverse of encode_features(). Cached: beds share a few distinct values.
+    """
+    if not raw:
+        return feature_set(())
+    return feature_set(raw.strip("|").split("|"))
+
+
+class _TxState(threading.local):
+    """
+    Per-thread begin()/commit() nesting depth (0 = autocommit per write)
+    and writes held back for the background writer until commit().
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.pending: List[Tuple[str, tuple]] = []
+
 
 class SQLiteBedStore:
     """
@@ -26,12 +188,125 @@ class SQLiteBedStore:
     FastAPI endpoints will call BedRegistry.
     """
 
-    def __init__(self, db_path: str = DB_PATH):
-        # check_same_thread=False so multiple FastAPI threads can share this connection
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        writer: Optional["StorageWorker"] = None,
+    ):
+        self.db_path = db_path
+        # Each thread gets its own connection (see db_pool.py); self.conn is
+        # the calling thread's one.
+        self.pool = ConnectionPool(db_path)
+        # Explicit transaction state, tracked per thread like the connection
+        self._tx = _TxState()
+        # Optional background writer. When set, writes are queued to it
+        # instead of running on self.conn (see storage_worker.py).
+        self._writer = writer
         self._init_schema()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self.pool.connection()
+
+    # ------------- transactions -------------
+
+    def begin(self) -> None:
+        """
+        Open an explicit transaction.
+
+        Writes issued until the matching commit() are grouped into a
+        single commit instead of one commit per statement. Calls may nest;
+        only the outermost commit() hits the disk.
+
+        The transaction takes SQLite's write lock up front (BEGIN IMMEDIATE):
+        under WAL a deferred transaction that reads and then writes can fail
+        with SQLITE_BUSY on the upgrade, which busy_timeout can't wait out.
+        """
+        if self._tx.depth == 0 and self._writer is None and not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._tx.depth += 1
+
+    def commit(self) -> None:
+        """
+        Close the current begin() level, committing if it was the outermost.
+        """
+        if self._tx.depth == 0:
+            return
+        self._tx.depth -= 1
+        if self._tx.depth:
+            return
+        if self._writer is not None:
+            # Hand the whole transaction to the worker as one unit
+            pending, self._tx.pending = self._tx.pending, []
+            if pending:
+                self._writer.submit_many(pending)
+        else:
+            self.conn.commit()
+
+    def rollback(self) -> None:
+        """
+        Abandon the whole open transaction, including any nested levels.
+        """
+        self._tx.depth = 0
+        self._tx.pending.clear()
+        if self._writer is None:
+            self.conn.rollback()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        begin()/commit() as a context manager; rolls back on error.
+        """
+        self.begin()
+        try:
+            yield
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def _run_write(self, sql: str, rows: List[tuple]) -> None:
+        """
+        Execute a write statement for each parameter tuple in rows.
+
+        Commits on its own unless an explicit transaction is open, in which
+        case the outer commit() covers it. With a background writer the
+        statements are queued instead of executed here.
+        """
+        if self._writer is not None:
+            if self._tx.depth:
+                self._tx.pending.extend((sql, r) for r in rows)
+            else:
+                self._writer.submit_many((sql, r) for r in rows)
+            return
+
+        if self._tx.depth:
+            self.conn.executemany(sql, rows)
+            return
+        with self.conn:
+            self.conn.executemany(sql, rows)
+
+    def _sync_reads(self) -> None:
+        """
+        Make sure queued background writes are visible before reading.
+        """
+        if self._writer is not None:
+            self._writer.sync()
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Connection to run a query on: a pooled read connection, or this
+        thread's own while it has a transaction open on it (so the
+        transaction sees its own uncommitted changes).
+        """
+        if self._tx.depth and self._writer is None:
+            yield self.conn
+            return
+        self._sync_reads()
+        with self.pool.read() as conn:
+            yield conn
+
     # ------------- schema -------------
 
     def _init_schema(self) -> None:
@@ -50,6 +325,50 @@ class SQLiteBedStore:
             )
             """
         )
+        # find_open_bed / list_beds filter on these columns
+        self.conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_beds_status_type_section
+            ON beds(status, bed_type, section)
+            """
+        )
+        # Most beds have no patient, so only index the ones that do.
+        # Not UNIQUE: SQLite checks uniqueness row by row, so the one-statement
+        # swap in swap_patients_between_beds would trip over itself.
+        self.conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_beds_patient
+            ON beds(patient_id) WHERE patient_id IS NOT NULL
+            """
+        )
+        self._migrate_json_features()
+        self.conn.commit()
+
+    def _migrate_json_features(self) -> None:
+        """
+        Older databases stored features as a JSON list; rewrite those rows
+        into the pipe-delimited form once.
+        """
+        rows = self.conn.execute(
+            "SELECT id, features FROM beds WHERE features LIKE '[%'"
+        ).fetchall()
+        if not rows:
+            return
+        updates = []
+        for row in rows:
+            try:
+                feats = orjson.loads(row["features"])
+            except orjson.JSONDecodeError:
+                feats = []
+            updates.append((encode_features(feats), row["id"]))
+        self.conn.executemany("UPDATE beds SET features = ? WHERE id = ?", updates)
+
+    def analyze(self) -> None:
+        """
+        Refresh the query planner's statistics. Run after bulk loads.
+        """
+        self._sync_reads()
+        self.conn.execute("ANALYZE")
         self.conn.commit()
 
     # ------------- helpers -------------
@@ -59,19 +378,11 @@ class SQLiteBedStore:
         """
         Convert a DB row into a Bed dataclass.
         """
-        features: Set[str] = set()
-        raw = row["features"]
-        if raw:
-            try:
-                features = set(json.loads(raw))
-            except json.JSONDecodeError:
-                features = set()
-
         return Bed(
             id=row["id"],
             bed_type=row["bed_type"],
             section=row["section"],
-            features=features,
+            features=decode_features(row["features"]),
             status=row["status"],
             patient_id=row["patient_id"],
         )
@@ -82,57 +393,135 @@ class SQLiteBedStore:
         """
         Insert a new bed row into the DB.
         """
-        self.conn.execute(
-            """
-            INSERT INTO beds (id, bed_type, section, features, status, patient_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
+        self._run_write(
+            _INSERT_SQL,
+            [(
+                bed.id,
+                bed.bed_type,
+                bed.section,
+                encode_features(bed.features),
+                bed.status,
+                bed.patient_id,
+            )],
+        )
+
+    def insert_beds_bulk(self, beds: List[Bed]) -> None:
+        """
+        Insert many beds in a single transaction (one commit for the batch).
+        """
+        rows = [
             (
                 bed.id,
                 bed.bed_type,
                 bed.section,
-                json.dumps(sorted(list(bed.features))),
+                encode_features(bed.features),
                 bed.status,
                 bed.patient_id,
-            ),
+            )
+            for bed in beds
+        ]
+        self._run_write(_INSERT_SQL, rows)
+
+    def insert_bed_series(
+        self,
+        bed_type: str,
+        section_prefix: str,
+        count: int,
+        features: Iterable[str] = (),
+    ) -> None:
+        """
+        Insert `count` identical OPEN beds named section_prefix + 1..count
+        with a single INSERT ... SELECT; the rows are generated by SQLite.
+        """
+        if count < 1:
+            return
+        self._run_write(
+            _INSERT_SERIES_SQL,
+            [(count, bed_type, section_prefix, encode_features(features))],
         )
-        self.conn.commit()
 
     def update_bed(self, bed: Bed) -> None:
         """
         Update an existing bed row.
         """
-        self.conn.execute(
-            """
-            UPDATE beds
-            SET bed_type = ?, section = ?, features = ?, status = ?, patient_id = ?
-            WHERE id = ?
-            """,
-            (
+        self._run_write(
+            _UPDATE_SQL,
+            [(
                 bed.bed_type,
                 bed.section,
-                json.dumps(sorted(list(bed.features))),
+                encode_features(bed.features),
                 bed.status,
                 bed.patient_id,
                 bed.id,
-            ),
+            )],
+        )
+
+    def set_status(self, bed_id: str, status: str, patient_id: Optional[str]) -> None:
+        """
+        Write just a bed's status and patient (no read, other columns untouched).
+        """
+        self._run_write(_SET_STATUS_SQL, [(status, patient_id, bed_id)])
+
+    def set_statuses(self, updates: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        """
+        set_status() for many (bed_id, status, patient_id) rows as one
+        executemany (one commit unless a transaction is open).
+        """
+        rows = [(status, patient_id, bed_id) for bed_id, status, patient_id in updates]
+        if rows:
+            self._run_write(_SET_STATUS_SQL, rows)
+
+    def set_status_pair(self, a: Bed, b: Bed) -> None:
+        """
+        Write the status and patient of two beds in a single UPDATE.
+        """
+        self._run_write(
+            _SET_STATUS_PAIR_SQL,
+            [(a.id, a.status, b.status, a.id, a.patient_id, b.patient_id, a.id, b.id)],
         )
-        self.conn.commit()
 
     def get_bed(self, bed_id: str) -> Optional[Bed]:
-        cur = self.conn.execute("SELECT * FROM beds WHERE id = ?", (bed_id,))
-        row = cur.fetchone()
+        with self._reader() as conn:
+            row = conn.execute(_GET_SQL, (bed_id,)).fetchone()
         if not row:
             return None
         return self._row_to_bed(row)
 
     def get_bed_by_patient(self, patient_id: str) -> Optional[Bed]:
-        cur = self.conn.execute("SELECT * FROM beds WHERE patient_id = ?", (patient_id,))
-        row = cur.fetchone()
+        with self._reader() as conn:
+            row = conn.execute(_GET_BY_PATIENT_SQL, (patient_id,)).fetchone()
         if not row:
             return None
         return self._row_to_bed(row)
 
+    def get_bed_with_patient_bed(
+        self, bed_id: str, patient_id: str
+    ) -> Tuple[Optional[Bed], Optional[Bed]]:
+        """
+        (bed `bed_id`, the bed `patient_id` occupies now) from one query.
+        Either may be None; both are the same Bed if the patient is already there.
+        """
+        bed = current = None
+        with self._reader() as conn:
+            for row in conn.execute(_GET_WITH_PATIENT_BED_SQL, (bed_id, patient_id)):
+                found = self._row_to_bed(row)
+                if found.id == bed_id:
+                    bed = found
+                if found.patient_id == patient_id:
+                    current = found
+        return bed, current
+
+    def get_bed_pair(self, bed_id_a: str, bed_id_b: str) -> Tuple[Optional[Bed], Optional[Bed]]:
+        """
+        Two beds by id from one query (None for an unknown id).
+        """
+        with self._reader() as conn:
+            found = {
+                row["id"]: self._row_to_bed(row)
+                for row in conn.execute(_GET_PAIR_SQL, (bed_id_a, bed_id_b))
+            }
+        return found.get(bed_id_a), found.get(bed_id_b)
+
     def list_beds(
         self,
         status: Optional[str] = None,
@@ -142,22 +531,93 @@ class SQLiteBedStore:
         """
         Get a list of beds filtered by optional fields.
         """
-        query = "SELECT * FROM beds WHERE 1=1"
-        params: List[str] = []
+        query, params = self._list_query("*", status, bed_type, section)
+        # Stream rows off the cursor (inside the block: the reader goes
+        # back to the pool on exit)
+        with self._reader() as conn:
+            return [self._row_to_bed(r) for r in conn.execute(query, params)]
 
-        if status:
-            query += " AND status = ?"
-            params.append(status)
-        if bed_type:
-            query += " AND bed_type = ?"
-            params.append(bed_type)
-        if section:
-            query += " AND section = ?"
-            params.append(section)
+    def list_beds_as_dicts(
+        self,
+        status: Optional[str] = None,
+        bed_type: Optional[str] = None,
+        section: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Same filters as list_beds(), but returns JSON-ready dicts directly
+        (same shape as Bed.to_dict()), skipping the Bed objects entirely.
+        """
+        query, params = self._list_query(_DICT_COLUMNS, status, bed_type, section)
+        with self._reader() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None  # plain tuples are cheaper than sqlite3.Row
+            return self._rows_to_dicts(cur.execute(query, params))
 
-        cur = self.conn.execute(query, params)
-        rows = cur.fetchall()
-        return [self._row_to_bed(r) for r in rows]
+    def list_beds_json(
+        self,
+        status: Optional[str] = None,
+        bed_type: Optional[str] = None,
+        section: Optional[str] = None,
+    ) -> bytes:
+        """
+        list_beds_as_dicts() already encoded as a JSON array, built inside
+        SQLite in one result row (no per-bed Python objects at all).
+        """
+        query, params = self._list_query(_JSON_ARRAY_COLUMNS, status, bed_type, section)
+        with self._reader() as conn:
+            return conn.execute(query, params).fetchone()[0].encode()
+
+    def get_beds_as_dicts(self, bed_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        JSON-ready dicts for the given bed ids (unknown ids are skipped).
+        """
+        ids = list(bed_ids)
+        if not ids:
+            return []
+        with self._reader() as conn:
+            cur = conn.cursor()
+            cur.row_factory = None
+            return self._rows_to_dicts(cur.execute(_GET_MANY_DICTS_SQL, (orjson.dumps(ids).decode(),)))
+
+    @staticmethod
+    def _rows_to_dicts(rows: Iterable[tuple]) -> List[Dict[str, Any]]:
+        """
+        (_DICT_COLUMNS) tuples -> dicts in Bed.to_dict() shape.
+        """
+        # Encoded features are stored sorted, so splitting keeps them sorted
+        return [
+            {
+                "bed_type": bed_type,
+                "section": section,
+                "features": features.strip("|").split("|") if features else [],
+                "status": status,
+                "id": bed_id,
+                "patient_id": patient_id,
+            }
+            for bed_id, bed_type, section, features, status, patient_id in rows
+        ]
+
+    @staticmethod
+    def _list_query(
+        columns: str,
+        status: Optional[str],
+        bed_type: Optional[str],
+        section: Optional[str],
+    ) -> Tuple[str, List[str]]:
+        """
+        Pick the SELECT for list_beds*() matching the optional filters.
+        """
+        query = _list_sql(columns, bool(status), bool(bed_type), bool(section))
+        params = [p for p in (status, bed_type, section) if p]
+        return query, params
+
+    def count_beds(self, status: Optional[str] = None) -> int:
+        """
+        Number of beds (optionally with a given status), without loading rows.
+        """
+        query, params = self._list_query("COUNT(*)", status, None, None)
+        with self._reader() as conn:
+            return conn.execute(query, params).fetchone()[0]
 
     def find_open_bed(
         self,
@@ -167,31 +627,56 @@ class SQLiteBedStore:
     ) -> Optional[Bed]:
         """
         Find an OPEN bed that matches bed_type, section, and required features.
-        Very simple "best match" for hackathon purposes: returns the first match.
+        Very simple "best match" for hackathon purposes: returns the matching
+        bed with the lowest section name.
         """
-        required_features = set(required_features or [])
-
-        query = "SELECT * FROM beds WHERE status = 'OPEN'"
-        params: List[str] = []
-
-        if needed_bed_type:
-            query += " AND bed_type = ?"
-            params.append(needed_bed_type)
-
-        if needed_section:
-            query += " AND section = ?"
-            params.append(needed_section)
-
-        cur = self.conn.execute(query, params)
-        candidates = [self._row_to_bed(r) for r in cur.fetchall()]
-
-        def matches_features(b: Bed) -> bool:
-            return required_features.issubset(b.features)
-
-        candidates = [b for b in candidates if matches_features(b)]
-
-        if not candidates:
+        query, params = self._find_open_query(
+            _find_open_sql, needed_bed_type, needed_section, required_features
+        )
+        with self._reader() as conn:
+            row = conn.execute(query, params).fetchone()
+        if not row:
             return None
+        return self._row_to_bed(row)
 
-        # You could sort by section or some scoring rule here.
-        return candidates[0]
+    def find_open_bed_for(
+        self,
+        patient_id: str,
+        needed_bed_type: Optional[str],
+        needed_section: Optional[str],
+        required_features: Optional[Iterable[str]],
+    ) -> Tuple[Optional[Bed], Optional[Bed]]:
+        """
+        (find_open_bed(...), get_bed_by_patient(patient_id)) in one query,
+        for assignments that also have to free the patient's current bed.
+        """
+        query, params = self._find_open_query(
+            _find_open_with_patient_sql, needed_bed_type, needed_section, required_features
+        )
+        params.append(patient_id)
+        match = current = None
+        with self._reader() as conn:
+            for row in conn.execute(query, params):
+                if row["is_current"]:
+                    current = self._row_to_bed(row)
+                else:
+                    match = self._row_to_bed(row)
+        return match, current
+
+    @staticmethod
+    def _find_open_query(
+        sql_for,
+        needed_bed_type: Optional[str],
+        needed_section: Optional[str],
+        required_features: Optional[Iterable[str]],
+    ) -> Tuple[str, List[str]]:
+        """
+        SQL (from the `sql_for` builder) and params for an open-bed search.
+        """
+        # Validated like a bed's own features: "a|b" would otherwise match
+        # a bed that has both "a" and "b"
+        required_features = feature_set(required_features or ())
+        query = sql_for(bool(needed_bed_type), bool(needed_section), len(required_features))
+        params = [p for p in (needed_bed_type, needed_section) if p]
+        params.extend(f"|{feature}|" for feature in sorted(required_features))
+        return query, params
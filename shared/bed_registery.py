@@ -8,11 +8,14 @@ to SQLiteBedStore in beds_db.py, so every change is mirrored to the
 SQLite database (hospital_beds.db by default).
 """
 
-import threading
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from bed import Bed
+from bed import BED_STATUSES, Bed
 from bed_db import SQLiteBedStore
+from rwlock import RWLock
+
+# Status filters come from the query string, so bound the JSON cache
+_LIST_CACHE_MAX = 8
 
 
 class BedRegistry:
@@ -21,14 +24,56 @@ class BedRegistry:
 
     Key ideas:
     - The actual data is stored in SQLite via SQLiteBedStore.
-    - BedRegistry adds concurrency safety and higher-level operations
+    - BedRegistry adds concurrency safety (concurrent readers, one writer
+      at a time) and higher-level operations
       like "assign the best available bed to this patient".
     """
 
     def __init__(self, store: Optional[SQLiteBedStore] = None) -> None:
         # You can inject a custom store for tests; otherwise use the default.
         self.store = store or SQLiteBedStore()
-        self._lock = threading.Lock()
+        # Guards mutations and the version-coupled state (_changed, the
+        # JSON cache). Plain store reads skip it: SQLite only shows them
+        # committed transactions, and a mutation's writes commit as one unit.
+        self._lock = RWLock()
+        # Bumped on every mutation so callers can tell when cached views are stale
+        self.version = 0
+        # bed id -> version of its last change, least recently changed first
+        self._changed: Dict[str, int] = {}
+        # Changes up to this version weren't tracked per bed (e.g. SQL-side
+        # bulk inserts), so changed_since() can't answer for older versions
+        self._untracked_through = 0
+        # status filter -> encoded list_beds() result, valid for one version
+        self._list_cache: Dict[Optional[str], bytes] = {}
+        self._list_cache_version = -1
+
+    def _touch(self, *bed_ids: Optional[str]) -> None:
+        """
+        Bump the version and record which beds it changed (call with
+        _lock held for writing).
+        """
+        self.version += 1
+        for bed_id in bed_ids:
+            if bed_id is not None:
+                # Re-insert so the dict stays ordered by change version
+                self._changed.pop(bed_id, None)
+                self._changed[bed_id] = self.version
+
+    def changed_since(self, version: int) -> Optional[List[str]]:
+        """
+        Ids of beds changed after `version`, or None if that can't be told
+        (version predates untracked changes, or is from the future, e.g.
+        another server process).
+        """
+        with self._lock.read():
+            if version < self._untracked_through or version > self.version:
+                return None
+            ids = []
+            for bed_id in reversed(self._changed):
+                if self._changed[bed_id] <= version:
+                    break
+                ids.append(bed_id)
+            return ids
 
     # ------------------------------------------------------------------
     # Basic CRUD-like operations
@@ -42,22 +87,71 @@ class BedRegistry:
         """
         Create a new Bed, persist it, and return the bed's id.
         """
-        bed = Bed(bed_type=bed_type, section=section, features=set(features))
-        with self._lock:
+        return self.create_bed(bed_type, section, features).id
+
+    def create_bed(
+        self,
+        bed_type: str,
+        section: str,
+        features: Iterable[str] = (),
+    ) -> Bed:
+        """
+        Like add_bed, but return the new Bed itself (no re-read needed).
+        """
+        bed = Bed(bed_type=bed_type, section=section, features=features)
+        with self._lock.write():
             self.store.insert_bed(bed)
-        return bed.id
+            self._touch(bed.id)
+        return bed
+
+    def add_beds_bulk(
+        self,
+        specs: Iterable[Tuple[str, str, Iterable[str]]],
+    ) -> List[str]:
+        """
+        Create many beds at once from (bed_type, section, features) tuples.
+
+        All rows are written in one transaction. Returns the new bed ids
+        in input order.
+        """
+        beds = [
+            Bed(bed_type=bed_type, section=section, features=features)
+            for bed_type, section, features in specs
+        ]
+        with self._lock.write():
+            self.store.insert_beds_bulk(beds)
+            self._touch(*(b.id for b in beds))
+        return [b.id for b in beds]
+
+    def add_bed_series(
+        self,
+        bed_type: str,
+        section_prefix: str,
+        count: int,
+        features: Iterable[str] = (),
+    ) -> None:
+        """
+        Create `count` identical beds named section_prefix + 1..count
+        (e.g. "OR-" -> OR-1, OR-2, ...) in one statement.
+        """
+        with self._lock.write():
+            self.store.insert_bed_series(bed_type, section_prefix, count, features)
+            # Ids are generated inside SQLite, so this change can't be itemized
+            self._touch()
+            self._untracked_through = self.version
 
     def upsert_bed(self, bed: Bed) -> str:
         """
         Insert or update a Bed object.
         If the id already exists, we overwrite that row.
         """
-        with self._lock:
+        with self._lock.write():
             existing = self.store.get_bed(bed.id)
             if existing:
                 self.store.update_bed(bed)
             else:
                 self.store.insert_bed(bed)
+            self._touch(bed.id)
         return bed.id
 
     def list_beds(
@@ -69,73 +163,133 @@ class BedRegistry:
         """
         Return beds as a list of plain dicts, ready to JSON-serialize.
         """
-        with self._lock:
-            beds = self.store.list_beds(
-                status=status,
-                bed_type=bed_type,
-                section=section,
-            )
-        return [b.to_dict() for b in beds]
+        return self.store.list_beds_as_dicts(
+            status=status,
+            bed_type=bed_type,
+            section=section,
+        )
+
+    def list_beds_json(self, status: Optional[str] = None) -> bytes:
+        """
+        list_beds(status=status) as JSON bytes, encoded once and reused
+        until the next mutation.
+        """
+        # Readers may fill the cache side by side; the version can't move
+        # while any of them holds the read lock, so they agree on it
+        with self._lock.read():
+            if self._list_cache_version != self.version:
+                self._list_cache.clear()
+                self._list_cache_version = self.version
+            body = self._list_cache.get(status)
+            if body is None:
+                body = self.store.list_beds_json(status=status)
+                if len(self._list_cache) < _LIST_CACHE_MAX:
+                    self._list_cache[status] = body
+            return body
+
+    def count_beds(self, status: Optional[str] = None) -> int:
+        """
+        Return how many beds exist (optionally only those with `status`).
+        """
+        return self.store.count_beds(status=status)
+
+    def get_many_as_dicts(self, bed_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Return the given beds as plain dicts (unknown ids are skipped).
+        """
+        return self.store.get_beds_as_dicts(bed_ids)
 
     def get(self, bed_id: str) -> Optional[Bed]:
         """
         Return the Bed object for a given id, or None.
         """
-        with self._lock:
-            return self.store.get_bed(bed_id)
+        return self.store.get_bed(bed_id)
 
     # ------------------------------------------------------------------
     # Status changes
     # ------------------------------------------------------------------
-    def free_bed(self, bed_id: str) -> None:
+    def free_bed(self, bed_id: str) -> Optional[Bed]:
         """
         Mark a bed as OPEN and clear any patient.
+        Returns the updated Bed, or None if the bed does not exist.
         """
-        with self._lock:
+        with self._lock.write():
             bed = self.store.get_bed(bed_id)
             if not bed:
-                return
+                return None
             bed.status = "OPEN"
             bed.patient_id = None
-            self.store.update_bed(bed)
+            self.store.set_status(bed.id, bed.status, bed.patient_id)
+            self._touch(bed.id)
+            return bed
 
     def hold_bed(
         self,
         bed_id: str,
         patient_id: Optional[str] = None,
-    ) -> None:
+    ) -> Optional[Bed]:
         """
         Mark a bed as HELD, optionally tying it to a patient.
+        Returns the updated Bed, or None if the bed does not exist.
         """
-        with self._lock:
+        with self._lock.write():
             bed = self.store.get_bed(bed_id)
             if not bed:
-                return
+                return None
             bed.status = "HELD"
             bed.patient_id = patient_id
-            self.store.update_bed(bed)
+            self.store.set_status(bed.id, bed.status, bed.patient_id)
+            self._touch(bed.id)
+            return bed
 
-    def occupy_bed(self, bed_id: str, patient_id: str) -> None:
+    def occupy_bed(self, bed_id: str, patient_id: str) -> Optional[Bed]:
         """
         Mark the bed as OCCUPIED by the given patient.
 
         If the patient already occupies another bed, that bed is freed
         first, so each patient can only have at most one bed.
+        Returns the updated Bed, or None if the bed does not exist.
+        """
+        with self._lock.write():
+            # Read and writes in one (BEGIN IMMEDIATE) transaction, so no
+            # other connection can change either bed in between
+            with self.store.transaction():
+                # Target bed and the patient's current bed in one read
+                bed, current = self.store.get_bed_with_patient_bed(bed_id, patient_id)
+                if not bed:
+                    return None
+
+                # If patient already has a bed, free it
+                if current and current.id != bed_id:
+                    current.status = "OPEN"
+                    current.patient_id = None
+                    self.store.set_status(current.id, current.status, None)
+                    self._touch(current.id)
+
+                bed.status = "OCCUPIED"
+                bed.patient_id = patient_id
+                self.store.set_status(bed.id, bed.status, patient_id)
+                self._touch(bed.id)
+                return bed
+
+    def bulk_update(self, actions: Iterable[Tuple[str, str, Optional[str]]]) -> None:
         """
-        with self._lock:
-            # If patient already has a bed, free it
-            current = self.store.get_bed_by_patient(patient_id)
-            if current and current.id != bed_id:
-                current.status = "OPEN"
-                current.patient_id = None
-                self.store.update_bed(current)
+        Apply many (bed_id, new_status, patient_id) changes in one transaction.
 
-            bed = self.store.get_bed(bed_id)
-            if not bed:
-                return
-            bed.status = "OCCUPIED"
-            bed.patient_id = patient_id
-            self.store.update_bed(bed)
+        For workflows that touch many beds at once (bulk discharge, rotations).
+        Rows are written as given: unknown bed ids are skipped, and keeping
+        one bed per patient is up to the caller.
+        """
+        rows = list(actions)
+        for bed_id, status, _ in rows:
+            if status not in BED_STATUSES:
+                raise ValueError(f"Invalid bed status {status!r} for bed {bed_id}")
+        if not rows:
+            return
+        with self._lock.write():
+            with self.store.transaction():
+                self.store.set_statuses(rows)
+            self._touch(*(bed_id for bed_id, _, _ in rows))
 
     # ------------------------------------------------------------------
     # Matching & assignment
@@ -152,40 +306,62 @@ class BedRegistry:
 
         Returns the bed_id or None if no matching open bed is found.
         """
-        with self._lock:
-            match = self.store.find_open_bed(
-                needed_bed_type=needed_bed_type,
-                needed_section=needed_section,
-                required_features=required_features,
-            )
-            if not match:
-                return None
-
-            # Free any current bed for this patient (single-occupancy invariant)
-            current = self.store.get_bed_by_patient(patient_id)
-            if current:
-                current.status = "OPEN"
-                current.patient_id = None
-                self.store.update_bed(current)
+        bed = self.assign_best_match(
+            patient_id,
+            needed_bed_type=needed_bed_type,
+            needed_section=needed_section,
+            required_features=required_features,
+        )
+        return bed.id if bed else None
 
-            # Occupy the new bed
-            match.status = "OCCUPIED"
-            match.patient_id = patient_id
-            self.store.update_bed(match)
-            return match.id
+    def assign_best_match(
+        self,
+        patient_id: str,
+        needed_bed_type: Optional[str] = None,
+        needed_section: Optional[str] = None,
+        required_features: Optional[Iterable[str]] = None,
+    ) -> Optional[Bed]:
+        """
+        Like assign_best_available, but return the updated Bed itself.
+        """
+        with self._lock.write():
+            with self.store.transaction():
+                # Best open bed and the patient's current bed in one read
+                match, current = self.store.find_open_bed_for(
+                    patient_id,
+                    needed_bed_type=needed_bed_type,
+                    needed_section=needed_section,
+                    required_features=required_features,
+                )
+                if not match:
+                    return None
+
+                # Free any current bed for this patient (single-occupancy invariant)
+                if current:
+                    current.status = "OPEN"
+                    current.patient_id = None
+                    self.store.set_status(current.id, current.status, None)
+
+                # Occupy the new bed
+                match.status = "OCCUPIED"
+                match.patient_id = patient_id
+                self.store.set_status(match.id, match.status, patient_id)
+                self._touch(current.id if current else None, match.id)
+                return match
 
     def release_patient(self, patient_id: str) -> Optional[str]:
         """
         Free whatever bed this patient is currently occupying.
         Returns the bed id that was freed, or None if they had no bed.
         """
-        with self._lock:
+        with self._lock.write():
             bed = self.store.get_bed_by_patient(patient_id)
             if not bed:
                 return None
             bed.status = "OPEN"
             bed.patient_id = None
-            self.store.update_bed(bed)
+            self.store.set_status(bed.id, bed.status, None)
+            self._touch(bed.id)
             return bed.id
 
     def transfer_patient_best_match(
@@ -201,28 +377,30 @@ class BedRegistry:
         Frees the old bed and occupies the new one atomically.
         Returns (from_bed_id, to_bed_id) or None if no match exists.
         """
-        with self._lock:
-            match = self.store.find_open_bed(
-                needed_bed_type=needed_bed_type,
-                needed_section=needed_section,
-                required_features=required_features,
-            )
-            if not match:
-                return None
-
-            current = self.store.get_bed_by_patient(patient_id)
-            from_id: Optional[str] = None
-            if current:
-                from_id = current.id
-                current.status = "OPEN"
-                current.patient_id = None
-                self.store.update_bed(current)
-
-            match.status = "OCCUPIED"
-            match.patient_id = patient_id
-            self.store.update_bed(match)
-
-            return (from_id, match.id)
+        with self._lock.write():
+            with self.store.transaction():
+                match, current = self.store.find_open_bed_for(
+                    patient_id,
+                    needed_bed_type=needed_bed_type,
+                    needed_section=needed_section,
+                    required_features=required_features,
+                )
+                if not match:
+                    return None
+
+                from_id: Optional[str] = None
+                if current:
+                    from_id = current.id
+                    current.status = "OPEN"
+                    current.patient_id = None
+                    self.store.set_status(current.id, current.status, None)
+
+                match.status = "OCCUPIED"
+                match.patient_id = patient_id
+                self.store.set_status(match.id, match.status, patient_id)
+                self._touch(from_id, match.id)
+
+                return (from_id, match.id)
 
     def swap_patients_between_beds(
         self,
@@ -234,23 +412,23 @@ class BedRegistry:
 
         Returns (patient_in_a, patient_in_b) after the swap.
         """
-        with self._lock:
-            a = self.store.get_bed(bed_id_a)
-            b = self.store.get_bed(bed_id_b)
-            if not a or not b:
-                return (None, None)
-
-            pa, pb = a.patient_id, b.patient_id
-            a.patient_id, b.patient_id = pb, pa
-
-            # Keep status consistent: a bed with a patient is OCCUPIED,
-            # an empty bed is OPEN.
-            a.status = "OCCUPIED" if a.patient_id else "OPEN"
-            b.status = "OCCUPIED" if b.patient_id else "OPEN"
-
-            self.store.update_bed(a)
-            self.store.update_bed(b)
-            return (pa, pb)
+        with self._lock.write():
+            with self.store.transaction():
+                a, b = self.store.get_bed_pair(bed_id_a, bed_id_b)
+                if not a or not b:
+                    return (None, None)
+
+                pa, pb = a.patient_id, b.patient_id
+                a.patient_id, b.patient_id = pb, pa
+
+                # Keep status consistent: a bed with a patient is OCCUPIED,
+                # an empty bed is OPEN.
+                a.status = "OCCUPIED" if a.patient_id else "OPEN"
+                b.status = "OCCUPIED" if b.patient_id else "OPEN"
+
+                self.store.set_status_pair(a, b)
+                self._touch(a.id, b.id)
+                return (pa, pb)
 
     # ------------------------------------------------------------------
     # Hooks to call from your API (optional helpers)
@@ -0,0 +1,132 @@
+# db_pool.py
+"""
+SQLite connection helpers shared by the store classes.
+
+SQLite allows many concurrent readers (under WAL) but only one writer.
+Rather than funnel every FastAPI worker thread through one shared
+connection (and its internal mutex), each thread gets its own connection,
+opened lazily the first time it touches the database. Readers then run
+in parallel and writers queue on SQLite's own lock (busy_timeout).
+
+Plain queries go through a small, bounded set of read-only connections
+instead (`read()`): each connection carries a 64 MB page cache, and the
+threadpool can have dozens of threads, so one connection per thread would
+mostly hold duplicate caches.
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+STATEMENT_CACHE_SIZE = 256
+
+# Read connections per pool; queries beyond this wait for a free one
+READ_POOL_SIZE = 4
+
+
+def apply_pragmas(conn: sqlite3.Connection, db_path: str) -> None:
+    """
+    Tune a connection for a read-heavy server workload.
+
+    WAL lets the dashboard's readers keep going while a write is in
+    progress, and synchronous=NORMAL drops the extra fsync per commit
+    (still crash-safe under WAL). WAL is not available for in-memory DBs.
+    A large page cache plus memory-mapped I/O keeps the (small) tables
+    resident so repeat queries don't go through read(2).
+    """
+    # Set first so the pragmas below wait on a busy database too
+    conn.execute("PRAGMA busy_timeout=30000")  # ms
+    # page_size only takes effect on a brand-new file, so it has to run
+    # before WAL is enabled and before any table exists
+    conn.execute("PRAGMA page_size=8192")
+    if db_path != ":memory:":
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            # Another connection (e.g. the storage worker starting up) is
+            # switching the file at the same moment; journal_mode is stored
+            # in the file, so it ends up WAL either way.
+            pass
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+
+
+class ConnectionPool:
+    """
+    One SQLite connection per thread, plus up to `readers` shared read-only ones.
+
+    `connection()` returns the calling thread's connection, creating it on
+    first use. `read()` checks out a read connection (opened lazily, up to
+    `readers`) and returns it to the pool afterwards. An in-memory database
+    can't be shared between connections, so for ":memory:" both hand out
+    the same (thread-shareable) one.
+    """
+
+    def __init__(self, db_path: str, readers: int = READ_POOL_SIZE) -> None:
+        self.db_path = db_path
+        self.readers = readers
+        self._local = threading.local()
+        self._shared: Optional[sqlite3.Connection] = None
+        if db_path == ":memory:":
+            self._shared = self._connect(check_same_thread=False)
+        self._idle: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+        self._opened = 0
+        self._open_lock = threading.Lock()
+
+    def _connect(
+        self, check_same_thread: bool = True, query_only: bool = False
+    ) -> sqlite3.Connection:
+        # sqlite3 keeps prepared statements per connection keyed by SQL text;
+        # the stores use constant SQL strings so repeat queries skip re-parsing.
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=check_same_thread,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.db_path)
+        if query_only:
+            # After apply_pragmas: switching a new file to WAL is a write
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        This thread's connection.
+        """
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._open_lock:
+            if self._opened < self.readers:
+                self._opened += 1
+                return self._connect(check_same_thread=False, query_only=True)
+        return self._idle.get()
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """
+        A read-only connection to run a query on, as a context manager.
+        Finish with any cursor before the block ends.
+        """
+        if self._shared is not None:
+            yield self._shared
+            return
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
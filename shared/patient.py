@@ -1,12 +1,60 @@
 # patient.py
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from enum import Enum
+import sys
 import uuid
 
 UTC = timezone.utc
 
+# Valid ESI levels (the patients table CHECKs the same range)
+ESI_MIN, ESI_MAX = 1, 5
+
+# ESI wait time thresholds (built once, not per is_delayed() call)
+ESI_MAX_WAIT = {
+    1: timedelta(minutes=0),    # Immediate
+    2: timedelta(minutes=10),   # 10 minutes
+    3: timedelta(minutes=30),   # 30 minutes
+    4: timedelta(minutes=60),   # 60 minutes
+    5: timedelta(minutes=120),  # 120 minutes
+}
+DEFAULT_MAX_WAIT = timedelta(minutes=30)
+
+# Small-vocabulary string fields stored interned (see Patient.__setattr__)
+_INTERNED_FIELDS = frozenset({"status", "department"})
+
+# Delay deadline of a patient with no start time for their current status
+_NEVER = datetime.max.replace(tzinfo=UTC)
+
+# Bits reserved for the arrival time (epoch microseconds) in priority_key
+_ARRIVAL_BITS = 56
+
+
+def priority_key(esi: int, arrival_ts: datetime) -> int:
+    """
+    Queue order (lower ESI first, then earlier arrival) packed into one int.
+
+    Equivalent to sorting by (esi, arrival_ts) at microsecond resolution,
+    but compares as a single integer - no tuple or datetime comparisons.
+    """
+    micros = int(arrival_ts.timestamp() * 1_000_000)
+    return (esi << _ARRIVAL_BITS) | micros
+
+
+# Bits for the arrival time (epoch seconds) in wire_sort_key: 2^40 s is
+# ~35,000 years, and ESI 5 << 40 keeps the key under 2^53
+_WIRE_ARRIVAL_BITS = 40
+
+
+def wire_sort_key(esi: int, arrival_ts: datetime) -> int:
+    """
+    The `sort_key` sent to clients: same order as priority_key() at
+    one-second resolution, small enough to survive a JavaScript Number
+    (priority_key exceeds 2^53 and would be rounded on parse).
+    """
+    return (esi << _WIRE_ARRIVAL_BITS) | int(arrival_ts.timestamp())
+
 
 class PatientStatus(str, Enum):
     """ER workflow stages"""
@@ -21,7 +69,15 @@ class PatientStatus(str, Enum):
     LEFT_WITHOUT_BEING_SEEN = "LWBS"
 
 
-@dataclass
+# Statuses of patients who have left the ER (never shown as active)
+INACTIVE_STATUSES = frozenset({
+    PatientStatus.DISCHARGED.value,
+    PatientStatus.ADMITTED.value,
+    PatientStatus.LEFT_WITHOUT_BEING_SEEN.value,
+})
+
+
+@dataclass(slots=True)
 class Patient:
     """
     Represents a patient in the ER flow.
@@ -52,52 +108,124 @@ class Patient:
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     arrival_ts: datetime = field(default_factory=lambda: datetime.now(UTC))
     timestamps: Dict[str, datetime] = field(default_factory=dict)
+    last_assessed_ts: Optional[datetime] = field(default=None, repr=False, compare=False)
+
+    # Derived/cached state, maintained by __setattr__. Declared as fields so
+    # slots=True reserves slots for them; excluded from __init__/repr/eq.
+    sort_key: int = field(init=False, repr=False, compare=False)
+    _cached_dict: Optional[dict] = field(init=False, repr=False, compare=False)
+    _delay_deadline: Optional[datetime] = field(init=False, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        # status/department come from a handful of values; interning them
+        # shares one string per value (rows loaded from SQLite otherwise
+        # each carry their own copy) and lets equality checks against the
+        # constants stop at the identity test
+        if name in _INTERNED_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        # Any field assignment invalidates the cached to_dict() fields and
+        # delay deadline
+        object.__setattr__(self, name, value)
+        if name not in ("_cached_dict", "_delay_deadline"):
+            object.__setattr__(self, "_cached_dict", None)
+            object.__setattr__(self, "_delay_deadline", None)
+            # Keep sort_key in step with the fields it's derived from
+            # (arrival_ts is the later of the two to be set in __init__)
+            if name in ("esi", "arrival_ts") and hasattr(self, "arrival_ts"):
+                object.__setattr__(self, "sort_key", priority_key(self.esi, self.arrival_ts))
 
     def __post_init__(self):
         """Record initial status timestamp"""
         if not self.timestamps:
             self.timestamps[self.status] = self.arrival_ts
 
-    def time_in_current_status(self) -> timedelta:
+    # The time-based helpers take an optional `now` so a caller serializing
+    # many patients can read the clock once for all of them.
+
+    def time_in_current_status(self, now: Optional[datetime] = None) -> timedelta:
         """Calculate how long patient has been in current status"""
         status_start = self.timestamps.get(self.status)
         if status_start:
-            return datetime.now(UTC) - status_start
+            return (now or datetime.now(UTC)) - status_start
         return timedelta(0)
 
-    def total_er_time(self) -> timedelta:
+    def total_er_time(self, now: Optional[datetime] = None) -> timedelta:
         """Total time since arrival"""
-        return datetime.now(UTC) - self.arrival_ts
+        return (now or datetime.now(UTC)) - self.arrival_ts
 
-    def is_delayed(self) -> bool:
+    def is_delayed(self, now: Optional[datetime] = None) -> bool:
         """Check if patient exceeds ESI wait time threshold"""
-        # ESI wait time thresholds in minutes
-        thresholds = {
-            1: 0,    # Immediate
-            2: 10,   # 10 minutes
-            3: 30,   # 30 minutes
-            4: 60,   # 60 minutes
-            5: 120   # 120 minutes
-        }
-        max_wait = timedelta(minutes=thresholds.get(self.esi, 30))
-        return self.time_in_current_status() > max_wait
+        return (now or datetime.now(UTC)) > self._deadline()
+
+    def _deadline(self) -> datetime:
+        """
+        When the patient turns delayed in their current status: status start
+        plus the ESI threshold. Memoized until the next mutation.
+        """
+        deadline = self._delay_deadline
+        if deadline is None:
+            status_start = self.timestamps.get(self.status)
+            if status_start:
+                deadline = status_start + ESI_MAX_WAIT.get(self.esi, DEFAULT_MAX_WAIT)
+            else:
+                deadline = _NEVER
+            self._delay_deadline = deadline
+        return deadline
 
     def update_status(self, new_status: str) -> None:
         """Update patient status and record timestamp"""
         self.status = new_status
         self.timestamps[new_status] = datetime.now(UTC)
+        # timestamps was mutated in place, which __setattr__ doesn't see
+        self._cached_dict = None
+        self._delay_deadline = None
+
+    def _static_dict(self) -> dict:
+        """Stored fields, serialized; memoized until the next mutation"""
+        d = self._cached_dict
+        if d is None:
+            d = {
+                "name": self.name,
+                "esi": self.esi,
+                "chief_complaint": self.chief_complaint,
+                "age": self.age,
+                "gender": self.gender,
+                "department": self.department,
+                "status": self.status,
+                "bed_id": self.bed_id,
+                "assigned_nurse_id": self.assigned_nurse_id,
+                "assigned_physician_id": self.assigned_physician_id,
+                "notes": self.notes,
+                "triage_notes": self.triage_notes,
+                "id": self.id,
+                "arrival_ts": self.arrival_ts.isoformat(),
+                # Not self.sort_key: that one is for in-memory ordering only
+                "sort_key": wire_sort_key(self.esi, self.arrival_ts),
+                # Serialize timestamps dict
+                "timestamps": {
+                    status: ts.isoformat()
+                    for status, ts in self.timestamps.items()
+                },
+            }
+            object.__setattr__(self, "_cached_dict", d)
+        return d
+
+    def iso_timestamps(self) -> Tuple[str, Dict[str, str]]:
+        """
+        (arrival_ts, {status: timestamp}) as ISO strings, for persistence.
+        Shares the strings to_dict() memoizes; treat the dict as read-only.
+        """
+        d = self._static_dict()
+        return d["arrival_ts"], d["timestamps"]
 
-    def to_dict(self) -> dict:
+    def to_dict(self, now: Optional[datetime] = None) -> dict:
         """Convert to dictionary for JSON serialization"""
-        d = asdict(self)
-        d["arrival_ts"] = self.arrival_ts.isoformat()
-        # Serialize timestamps dict
-        d["timestamps"] = {
-            status: ts.isoformat()
-            for status, ts in self.timestamps.items()
-        }
-        # Add computed fields
-        d["time_in_current_status_minutes"] = int(self.time_in_current_status().total_seconds() / 60)
-        d["total_er_time_minutes"] = int(self.total_er_time().total_seconds() / 60)
-        d["is_delayed"] = self.is_delayed()
+        d = dict(self._static_dict())
+        # Add computed fields (time-dependent, so never cached); one clock read
+        if now is None:
+            now = datetime.now(UTC)
+        in_status = self.time_in_current_status(now)
+        d["time_in_current_status_minutes"] = int(in_status.total_seconds() / 60)
+        d["total_er_time_minutes"] = int(self.total_er_time(now).total_seconds() / 60)
+        d["is_delayed"] = now > self._deadline()
         return d
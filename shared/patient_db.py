@@ -6,31 +6,101 @@ This module manages the SQLite database for the 'patients' table.
 Works alongside bed_db.py using the same hospital_flow.db database.
 """
 
-import json
 import sqlite3
 from datetime import datetime, timezone
-from typing import List, Optional
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
 
-from patient import Patient, PatientStatus
+import orjson
+
+from db_pool import ConnectionPool
+from patient import INACTIVE_STATUSES, Patient, PatientStatus
+
+if TYPE_CHECKING:
+    from storage_worker import StorageWorker
 
 # Use same database as beds
 DB_PATH = "hospital_flow.db"
 UTC = timezone.utc
 
+_PATIENT_COLUMNS = (
+    "id", "name", "esi", "chief_complaint", "age", "gender", "department", "status",
+    "bed_id", "assigned_nurse_id", "assigned_physician_id", "notes", "triage_notes",
+    "arrival_ts", "timestamps",
+)
+
+# SQL list of the statuses list_active_patients() leaves out. Written as
+# literals (not bound) so the partial index below can match the query;
+# kept in enum declaration order so the text is the same in every process.
+_INACTIVE_SQL = "({})".format(", ".join(
+    f"'{s.value}'" for s in PatientStatus if s.value in INACTIVE_STATUSES
+))
+
+# Constant SQL text, so each connection's statement cache (keyed by the
+# text) reuses the prepared statement instead of re-parsing it per call
+_INSERT_SQL = (
+    f"INSERT INTO patients ({', '.join(_PATIENT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_PATIENT_COLUMNS))})"
+)
+# Parameters: every column but id, in _PATIENT_COLUMNS order, then id
+_UPDATE_SQL = (
+    "UPDATE patients SET "
+    + ", ".join(f"{c} = ?" for c in _PATIENT_COLUMNS[1:])
+    + " WHERE id = ?"
+)
+_GET_SQL = "SELECT * FROM patients WHERE id = ?"
+
+# Insert-or-update in one statement (no SELECT first to see which one applies)
+_UPSERT_SQL = (
+    _INSERT_SQL + " ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in _PATIENT_COLUMNS[1:])
+)
+
+
+@lru_cache(maxsize=None)
+def _list_sql(active_only: bool, by_department: bool, by_status: bool) -> str:
+    """
+    SQL text for one combination of list filters, built once (same
+    statement-cache reasoning as bed_db._list_sql).
+    """
+    if active_only:
+        # Literal status list, so SQLite can answer from idx_patients_active
+        query = f"SELECT * FROM patients WHERE status NOT IN {_INACTIVE_SQL}"
+    else:
+        query = "SELECT * FROM patients WHERE 1=1"
+    if by_department:
+        query += " AND department = ?"
+    if by_status:
+        query += " AND status = ?"
+    return query
+
 
 class SQLitePatientStore:
     """
     Thin wrapper around a SQLite 'patients' table.
 
     Provides persistence for Patient objects, similar to SQLiteBedStore for Bed objects.
+
+    If a StorageWorker is given, writes are queued to its thread (so they
+    never block the caller) and reads flush it first, as in SQLiteBedStore.
+    Reads go through a small pool of read-only connections (see db_pool.py),
+    so dashboard queries run side by side instead of queueing on self.conn.
+    Every connection comes from the pool, so all of them get the same
+    pragmas (db_pool.apply_pragmas: WAL, synchronous=NORMAL, page cache).
     """
 
-    def __init__(self, db_path: str = DB_PATH):
-        # check_same_thread=False so multiple FastAPI threads can share this connection
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+    def __init__(self, db_path: str = DB_PATH, writer: Optional["StorageWorker"] = None):
+        # Each thread gets its own connection (see db_pool.py); self.conn is
+        # the calling thread's one, as in SQLiteBedStore.
+        self.pool = ConnectionPool(db_path)
+        self._writer = writer
         self._init_schema()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self.pool.connection()
+
     # ------------- schema -------------
 
     def _init_schema(self) -> None:
@@ -58,10 +128,60 @@ class SQLitePatientStore:
             )
             """
         )
+        # list_patients filters on department and/or status
+        self.conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_patients_dept_status
+            ON patients(department, status)
+            """
+        )
+        # Active patients only (discharged ones pile up over time), in
+        # queue order within a department
+        self.conn.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_patients_active
+            ON patients(department, esi, arrival_ts)
+            WHERE status NOT IN {_INACTIVE_SQL}
+            """
+        )
         self.conn.commit()
 
     # ------------- helpers -------------
 
+    def _write(self, sql: str, params: tuple) -> None:
+        """
+        Run one write statement, via the background writer if there is one.
+        """
+        self._write_many(sql, [params])
+
+    def _write_many(self, sql: str, rows: List[tuple]) -> None:
+        """
+        Run a write statement for every parameter tuple, committed together.
+        """
+        if not rows:
+            return
+        if self._writer is not None:
+            self._writer.submit_many((sql, params) for params in rows)
+        else:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+
+    def _sync_reads(self) -> None:
+        """
+        Make queued writes visible before reading.
+        """
+        if self._writer is not None:
+            self._writer.sync()
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Pooled read connection, after any queued writes are committed.
+        """
+        self._sync_reads()
+        with self.pool.read() as conn:
+            yield conn
+
     @staticmethod
     def _row_to_patient(row: sqlite3.Row) -> Patient:
         """
@@ -72,12 +192,12 @@ class SQLitePatientStore:
         raw_timestamps = row["timestamps"]
         if raw_timestamps:
             try:
-                timestamps_json = json.loads(raw_timestamps)
+                timestamps_json = orjson.loads(raw_timestamps)
                 timestamps_dict = {
                     status: datetime.fromisoformat(ts)
                     for status, ts in timestamps_json.items()
                 }
-            except (json.JSONDecodeError, ValueError):
+            except (orjson.JSONDecodeError, ValueError):
                 timestamps_dict = {}
 
         # Parse arrival timestamp
@@ -106,11 +226,10 @@ class SQLitePatientStore:
         """
         Convert Patient dataclass to tuple for DB insertion/update.
         """
-        # Serialize timestamps dict to JSON
-        timestamps_json = json.dumps({
-            status: ts.isoformat()
-            for status, ts in patient.timestamps.items()
-        })
+        # Reuse the ISO strings Patient already memoizes for to_dict(), so a
+        # change that's both persisted and broadcast formats them only once
+        arrival_iso, timestamps_iso = patient.iso_timestamps()
+        timestamps_json = orjson.dumps(timestamps_iso).decode()
 
         return (
             patient.id,
@@ -126,7 +245,7 @@ class SQLitePatientStore:
             patient.assigned_physician_id,
             patient.notes,
             patient.triage_notes,
-            patient.arrival_ts.isoformat(),
+            arrival_iso,
             timestamps_json,
         )
 
@@ -136,44 +255,48 @@ class SQLitePatientStore:
         """
         Insert a new patient row into the DB.
         """
-        values = self._patient_to_values(patient)
-        self.conn.execute(
-            """
-            INSERT INTO patients (
-                id, name, esi, chief_complaint, age, gender, department, status,
-                bed_id, assigned_nurse_id, assigned_physician_id, notes, triage_notes,
-                arrival_ts, timestamps
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            values,
-        )
-        self.conn.commit()
+        self.insert_patients([patient])
+
+    def insert_patients(self, patients: Iterable[Patient]) -> None:
+        """
+        Insert many patient rows with one executemany and a single commit.
+        """
+        self._write_many(_INSERT_SQL, [self._patient_to_values(p) for p in patients])
 
     def update_patient(self, patient: Patient) -> None:
         """
         Update an existing patient row.
         """
-        values = self._patient_to_values(patient)
-        self.conn.execute(
-            """
-            UPDATE patients
-            SET name = ?, esi = ?, chief_complaint = ?, age = ?, gender = ?,
-                department = ?, status = ?, bed_id = ?, assigned_nurse_id = ?,
-                assigned_physician_id = ?, notes = ?, triage_notes = ?,
-                arrival_ts = ?, timestamps = ?
-            WHERE id = ?
-            """,
-            values[1:] + (values[0],),  # All fields except id, then id at the end
-        )
-        self.conn.commit()
+        self.update_patients([patient])
+
+    def update_patients(self, patients: Iterable[Patient]) -> None:
+        """
+        Update many existing patient rows with one executemany and a single commit.
+        """
+        rows = []
+        for p in patients:
+            values = self._patient_to_values(p)
+            rows.append(values[1:] + (values[0],))  # All fields except id, then id at the end
+        self._write_many(_UPDATE_SQL, rows)
+
+    def upsert_patient(self, patient: Patient) -> None:
+        """
+        Insert the patient, or overwrite the existing row with the same id.
+        """
+        self._write(_UPSERT_SQL, self._patient_to_values(patient))
+
+    def upsert_patients(self, patients: Iterable[Patient]) -> None:
+        """
+        upsert_patient() for many patients, committed together.
+        """
+        self._write_many(_UPSERT_SQL, [self._patient_to_values(p) for p in patients])
 
     def get_patient(self, patient_id: str) -> Optional[Patient]:
         """
         Get a single patient by ID.
         """
-        cur = self.conn.execute("SELECT * FROM patients WHERE id = ?", (patient_id,))
-        row = cur.fetchone()
+        with self._reader() as conn:
+            row = conn.execute(_GET_SQL, (patient_id,)).fetchone()
         if not row:
             return None
         return self._row_to_patient(row)
@@ -186,44 +309,24 @@ class SQLitePatientStore:
         """
         Get a list of patients filtered by optional fields.
         """
-        query = "SELECT * FROM patients WHERE 1=1"
-        params: List[str] = []
-
-        if department:
-            query += " AND department = ?"
-            params.append(department)
-        if status:
-            query += " AND status = ?"
-            params.append(status)
-
-        cur = self.conn.execute(query, params)
-        rows = cur.fetchall()
+        query = _list_sql(False, bool(department), bool(status))
+        params = [v for v in (department, status) if v]
+        with self._reader() as conn:
+            rows = conn.execute(query, params).fetchall()
         return [self._row_to_patient(r) for r in rows]
 
     def list_active_patients(self, department: Optional[str] = None) -> List[Patient]:
         """
         Get all active patients (not DISCHARGED, ADMITTED, or LWBS).
         """
-        inactive_statuses = (
-            PatientStatus.DISCHARGED.value,
-            PatientStatus.ADMITTED.value,
-            PatientStatus.LEFT_WITHOUT_BEING_SEEN.value,
-        )
-
-        query = "SELECT * FROM patients WHERE status NOT IN (?, ?, ?)"
-        params = list(inactive_statuses)
-
-        if department:
-            query += " AND department = ?"
-            params.append(department)
-
-        cur = self.conn.execute(query, params)
-        rows = cur.fetchall()
+        query = _list_sql(True, bool(department), False)
+        params = [department] if department else []
+        with self._reader() as conn:
+            rows = conn.execute(query, params).fetchall()
         return [self._row_to_patient(r) for r in rows]
 
     def delete_patient(self, patient_id: str) -> None:
         """
         Delete a patient from the database (use sparingly - prefer status updates).
         """
-        self.conn.execute("DELETE FROM patients WHERE id = ?", (patient_id,))
-        self.conn.commit()
+        self._write("DELETE FROM patients WHERE id = ?", (patient_id,))
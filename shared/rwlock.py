@@ -0,0 +1,72 @@
+# rwlock.py
+"""
+Readers-writer lock for the in-process registries.
+
+BedRegistry's dashboard traffic is almost all reads (list_beds, get,
+counts), and those are safe to run side by side: each thread has its own
+SQLite connection (see db_pool.py). Only mutations need to exclude
+everyone else. A plain Lock serializes both; RWLock lets any number of
+readers in at once and gives a writer the lock alone.
+
+Waiting writers block new readers, so a steady stream of polls can't
+starve a mutation. The lock is not reentrant: don't take it again
+(either side) while holding it.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class RWLock:
+    """
+    Many readers or one writer; writers are preferred.
+
+    Usage:
+        lock = RWLock()
+        with lock.read():
+            ...
+        with lock.write():
+            ...
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """
+        Hold the lock shared for the duration of the block.
+        """
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """
+        Hold the lock exclusively for the duration of the block.
+        """
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
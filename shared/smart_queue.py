@@ -1,14 +1,26 @@
 # smart_queue.py
+from bisect import bisect_left, insort
 from datetime import datetime, timezone
 import heapq
 import itertools
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from patient import Patient, PatientStatus  # assumes patient.py is in the same folder
+from patient import ESI_MAX, ESI_MIN, INACTIVE_STATUSES, Patient, PatientStatus  # assumes patient.py is in the same folder
 from patient_db import SQLitePatientStore
 
 UTC = timezone.utc
-_counter = itertools.count()  # ensures stable ordering for ties
+
+# Patients still in the waiting room, i.e. not yet assigned a bed
+WAITING_ROOM_STATUSES = frozenset({
+    PatientStatus.REGISTERED.value,
+    PatientStatus.AWAITING_TRIAGE.value,
+    PatientStatus.TRIAGED.value,
+})
+
+# (patient.sort_key, patient_id) - sort key for the per-status indexes;
+# sort_key packs (esi, arrival_ts) into one int, see patient.priority_key
+StatusKey = Tuple[int, str]
 
 class SmartQueue:
     """
@@ -20,11 +32,32 @@ class SmartQueue:
     Tracks all active patients (not just waiting for triage) for dashboard display.
     Now with SQLite persistence!
     """
-    def __init__(self, department: str = "ED"):
+    def __init__(self, department: str = "ED", store: Optional[SQLitePatientStore] = None):
         self.department = department
-        self._heap: List[Tuple[int, datetime, int, str]] = []  # (esi, arrival_ts, counter, patient_id)
+        self._heap: List[Tuple[int, int, str]] = []  # (sort_key, counter, patient_id)
+        # patient_id -> counter of its live heap entry. Entries are never
+        # removed from the middle of the heap; one whose counter no longer
+        # matches is a tombstone and gets skipped when it reaches the top.
+        self._heap_live: Dict[str, int] = {}
+        # Heap tokens; per queue so departments don't share one sequence
+        # (next() on a count is atomic, so no lock is needed)
+        self._counter = itertools.count()
         self._patients: Dict[str, Patient] = {}
-        self.store = SQLitePatientStore()  # Database persistence layer
+        # Secondary indexes, kept in sync by every mutation:
+        #   status -> sorted [(sort_key, id)]         (priority order)
+        #   department -> sorted [(arrival_ts, id)]   (arrival order)
+        #   sorted [(sort_key, id)] of WAITING_ROOM_STATUSES patients
+        self._by_status: Dict[str, List[StatusKey]] = {}
+        self._waiting: List[StatusKey] = []
+        self._by_department: Dict[str, List[Tuple[datetime, str]]] = {}
+        self.store = store or SQLitePatientStore()  # Database persistence layer
+        self.version = 0  # Bumped on every mutation (for cache invalidation)
+        # patient_id -> version of its last change, least recently changed first
+        self._changed: Dict[str, int] = {}
+        # statuses -> (version, _ordered() result), reused until the next mutation
+        self._ordered_cache: Dict[Tuple[str, ...], Tuple[int, List[Patient]]] = {}
+        # Mutations may run on FastAPI's threadpool; serialize them like BedRegistry does
+        self._lock = threading.RLock()
 
         # Load existing patients from database on startup
         self._load_from_db()
@@ -35,30 +68,116 @@ class SmartQueue:
         patients = self.store.list_active_patients(department=self.department)
         for p in patients:
             self._patients[p.id] = p
+            self._index_add(p)
+        for p in patients:
+            self._by_department.setdefault(p.department, []).append((p.arrival_ts, p.id))
+        for keys in self._by_department.values():
+            keys.sort()
         self._rebuild_heap()
 
     def _sync_to_db(self, patient: Patient) -> None:
-        """Save or update patient in database"""
-        existing = self.store.get_patient(patient.id)
-        if existing:
-            self.store.update_patient(patient)
-        else:
-            self.store.insert_patient(patient)
-
-    def _key(self, p: Patient) -> Tuple[int, datetime, int, str]:
-        # Lower ESI first, then earlier arrival, then stable counter, then id
-        return (p.esi, p.arrival_ts, next(_counter), p.id)
+        """Save or update patient in database (one upsert, no read first)"""
+        self.store.upsert_patient(patient)
 
     def _rebuild_heap(self) -> None:
-        """Rebuild heap with patients awaiting triage"""
+        """Rebuild heap with patients awaiting triage (drops all tombstones)"""
         self._heap.clear()
-        for p in self._patients.values():
-            if p.status == PatientStatus.AWAITING_TRIAGE.value and p.department == self.department:
-                heapq.heappush(self._heap, self._key(p))
+        self._heap_live.clear()
+        for _, pid in self._by_status.get(PatientStatus.AWAITING_TRIAGE.value, ()):
+            p = self._patients[pid]
+            if p.department == self.department:
+                # Index order is heap order, so no heapify needed
+                token = next(self._counter)
+                self._heap_live[pid] = token
+                self._heap.append((p.sort_key, token, pid))
+
+    def _heap_sync(self, p: Patient) -> None:
+        """
+        Bring the triage heap up to date after `p` changed status or ESI.
+
+        O(log N) instead of a full rebuild: a patient awaiting triage gets a
+        fresh entry (superseding any old one), anyone else just loses theirs.
+        """
+        if p.status == PatientStatus.AWAITING_TRIAGE.value and p.department == self.department:
+            token = next(self._counter)
+            self._heap_live[p.id] = token
+            heapq.heappush(self._heap, (p.sort_key, token, p.id))
+        else:
+            self._heap_live.pop(p.id, None)
+        # Compact once tombstones outnumber live entries
+        if len(self._heap) > 2 * len(self._heap_live) + 64:
+            self._rebuild_heap()
+
+    def _touch(self, p: Patient) -> None:
+        """Bump the version and record that `p` changed in it (call under _lock)"""
+        self.version += 1
+        # Re-insert so the dict stays ordered by change version
+        self._changed.pop(p.id, None)
+        self._changed[p.id] = self.version
+
+    @staticmethod
+    def _status_key(p: Patient) -> StatusKey:
+        return (p.sort_key, p.id)
+
+    def _index_add(self, p: Patient) -> None:
+        """Add a patient to the status indexes under its current status/ESI"""
+        key = self._status_key(p)
+        insort(self._by_status.setdefault(p.status, []), key)
+        if p.status in WAITING_ROOM_STATUSES:
+            insort(self._waiting, key)
+
+    def _index_remove(self, status: str, key: StatusKey) -> None:
+        """Drop `key` from the status indexes for `status`"""
+        self._sorted_discard(self._by_status.get(status), key)
+        if status in WAITING_ROOM_STATUSES:
+            self._sorted_discard(self._waiting, key)
+
+    @staticmethod
+    def _sorted_discard(keys: Optional[List[StatusKey]], key: StatusKey) -> None:
+        if not keys:
+            return
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def _ordered(self, statuses: Iterable[str]) -> List[Patient]:
+        """
+        Patients in any of `statuses`, by ESI then arrival.
+
+        Each status list is already sorted, so this is a k-way merge of the
+        requested slices rather than a scan + sort of every patient. The
+        result is cached per status set until the next mutation (`version`);
+        callers get the shared list, so they must not modify it.
+        """
+        statuses = tuple(statuses)
+        # Read the version before the indexes: a mutation racing with the
+        # merge then leaves the entry already stale, never wrongly fresh
+        version = self.version
+        cached = self._ordered_cache.get(statuses)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # list() each index first: a mutation on another thread may be
+        # inserting into them while we merge
+        slices = [list(self._by_status.get(s, ())) for s in statuses]
+        patients = (self._patients[pid] for _, pid in heapq.merge(*slices))
+        ordered = [p for p in patients if p.department == self.department]
+        if len(self._ordered_cache) > 32:
+            # Arbitrary status sets come from the API; don't grow unbounded
+            self._ordered_cache.clear()
+        self._ordered_cache[statuses] = (version, ordered)
+        return ordered
 
     # ------------ public API ------------
+    @staticmethod
+    def _check_esi(esi: int) -> None:
+        # Writes are queued, so the table's CHECK would only fail later, on
+        # the writer thread; reject here before the queue holds the patient
+        if not ESI_MIN <= esi <= ESI_MAX:
+            raise ValueError(f"ESI must be between {ESI_MIN} and {ESI_MAX}, got {esi}")
+
     def add_patient(self, name: str, esi: int, chief_complaint: str, age: int, gender: str, notes: str = "") -> str:
         """Register a new patient in the ER"""
+        self._check_esi(esi)
         p = Patient(
             name=name,
             esi=esi,
@@ -68,12 +187,16 @@ class SmartQueue:
             department=self.department,
             notes=notes
         )
-        self._patients[p.id] = p
-        # Add to heap since default status is AWAITING_TRIAGE
-        heapq.heappush(self._heap, self._key(p))
+        with self._lock:
+            self._patients[p.id] = p
+            self._index_add(p)
+            insort(self._by_department.setdefault(p.department, []), (p.arrival_ts, p.id))
+            # Add to heap since default status is AWAITING_TRIAGE
+            self._heap_sync(p)
 
-        # Persist to database
-        self._sync_to_db(p)
+            # Persist to database
+            self._sync_to_db(p)
+            self._touch(p)
 
         return p.id
 
@@ -81,85 +204,143 @@ class SmartQueue:
         return self._patients.get(patient_id)
 
     def update_esi(self, patient_id: str, new_esi: int) -> None:
-        p = self._patients[patient_id]
-        p.esi = new_esi
-        p.last_assessed_ts = datetime.now(UTC)
-        self._rebuild_heap()
-        self._sync_to_db(p)
+        self._check_esi(new_esi)
+        with self._lock:
+            p = self._patients[patient_id]
+            self._index_remove(p.status, self._status_key(p))
+            p.esi = new_esi
+            self._index_add(p)
+            p.last_assessed_ts = datetime.now(UTC)
+            self._heap_sync(p)
+            self._sync_to_db(p)
+            self._touch(p)
 
     def update_status(self, patient_id: str, new_status: str) -> None:
         """Update patient status and record timestamp"""
-        p = self._patients[patient_id]
-        p.update_status(new_status)
-        # Only AWAITING_TRIAGE patients live in the heap
-        self._rebuild_heap()
-        self._sync_to_db(p)
+        with self._lock:
+            p = self._patients[patient_id]
+            self._index_remove(p.status, self._status_key(p))
+            p.update_status(new_status)
+            self._index_add(p)
+            # Only AWAITING_TRIAGE patients live in the heap
+            self._heap_sync(p)
+            self._sync_to_db(p)
+            self._touch(p)
 
     def assign_bed(self, patient_id: str, bed_id: str) -> None:
         """Assign a bed to a patient and update status to IN_BED"""
-        p = self._patients[patient_id]
-        p.bed_id = bed_id
-        p.update_status(PatientStatus.IN_BED.value)
-        self._rebuild_heap()
-        self._sync_to_db(p)
+        with self._lock:
+            p = self._patients[patient_id]
+            p.bed_id = bed_id
+            self._index_remove(p.status, self._status_key(p))
+            p.update_status(PatientStatus.IN_BED.value)
+            self._index_add(p)
+            self._heap_sync(p)
+            self._sync_to_db(p)
+            self._touch(p)
 
     def assign_nurse(self, patient_id: str, nurse_id: str) -> None:
         """Assign a nurse to a patient"""
-        p = self._patients[patient_id]
-        p.assigned_nurse_id = nurse_id
-        self._sync_to_db(p)
+        with self._lock:
+            p = self._patients[patient_id]
+            p.assigned_nurse_id = nurse_id
+            self._sync_to_db(p)
+            self._touch(p)
 
     def assign_physician(self, patient_id: str, physician_id: str) -> None:
         """Assign a physician to a patient"""
-        p = self._patients[patient_id]
-        p.assigned_physician_id = physician_id
-        self._sync_to_db(p)
+        with self._lock:
+            p = self._patients[patient_id]
+            p.assigned_physician_id = physician_id
+            self._sync_to_db(p)
+            self._touch(p)
 
     def next_awaiting_triage(self) -> Optional[Patient]:
         """Get the highest-priority patient awaiting triage without changing status"""
-        while self._heap:
-            _, _, _, pid = heapq.heappop(self._heap)
-            p = self._patients.get(pid)
-            if not p:
-                continue
-            if p.status == PatientStatus.AWAITING_TRIAGE.value and p.department == self.department:
-                # Don't change status, just return the patient
-                # Re-add to heap since we're just peeking
-                heapq.heappush(self._heap, self._key(p))
-                return p
-        return None
+        with self._lock:
+            while self._heap:
+                _, token, pid = self._heap[0]
+                if self._heap_live.get(pid) == token:
+                    # Don't change status, just return the patient
+                    # (peeking: the entry stays on the heap)
+                    return self._patients[pid]
+                # Tombstone (patient moved on or was re-keyed); discard it
+                heapq.heappop(self._heap)
+            return None
+
+    def all_patients(self) -> List[Patient]:
+        """
+        Snapshot of every tracked patient.
+
+        Readers run on the event loop while a mutation may be inserting into
+        _patients on a worker thread; list() copies the values in one step so
+        iteration never sees the dict change size.
+        """
+        return list(self._patients.values())
+
+    def _active_statuses(self) -> List[str]:
+        """Statuses currently holding at least one active patient"""
+        return [s for s, keys in list(self._by_status.items()) if keys and s not in INACTIVE_STATUSES]
 
     def get_all_active_patients(self) -> List[dict]:
         """Get all patients except DISCHARGED, ADMITTED, or LWBS - sorted by ESI then arrival"""
-        inactive_statuses = {
-            PatientStatus.DISCHARGED.value,
-            PatientStatus.ADMITTED.value,
-            PatientStatus.LEFT_WITHOUT_BEING_SEEN.value
-        }
-        active = [
-            p for p in self._patients.values()
-            if p.status not in inactive_statuses and p.department == self.department
-        ]
-        active.sort(key=lambda p: (p.esi, p.arrival_ts))
-        return [p.to_dict() for p in active]
+        now = datetime.now(UTC)
+        return [p.to_dict(now) for p in self._ordered(self._active_statuses())]
+
+    def count_patients(self) -> int:
+        """Number of active patients in this department (no serialization)"""
+        return len(self._ordered(self._active_statuses()))
 
     def get_patients_by_status(self, status: str) -> List[dict]:
         """Get all patients with a specific status"""
-        patients = [
-            p for p in self._patients.values()
-            if p.status == status and p.department == self.department
-        ]
-        patients.sort(key=lambda p: (p.esi, p.arrival_ts))
-        return [p.to_dict() for p in patients]
+        now = datetime.now(UTC)
+        return [p.to_dict(now) for p in self._ordered((status,))]
+
+    def get_waiting_room_patients(self) -> List[dict]:
+        """Patients not yet in a bed (REGISTERED, AWAITING_TRIAGE, TRIAGED), by ESI then arrival"""
+        # One presorted list, so no merge needed; [:] copies it atomically
+        patients = (self._patients[pid] for _, pid in self._waiting[:])
+        now = datetime.now(UTC)
+        return [p.to_dict(now) for p in patients if p.department == self.department]
+
+    def get_patients_by_arrival(self, department: Optional[str] = None) -> List[dict]:
+        """Every tracked patient (any status) in a department, most recent arrival first"""
+        keys = self._by_department.get(department or self.department, [])
+        # [::-1] copies (safe against concurrent inserts) and reverses in one step
+        now = datetime.now(UTC)
+        return [self._patients[pid].to_dict(now) for _, pid in keys[::-1]]
+
+    def count_ahead(self, patient: Patient) -> int:
+        """
+        How many waiting-room patients are ahead of `patient`: lower ESI,
+        or same ESI and earlier arrival. A single O(log N) bisect.
+        """
+        # (sort_key,) sorts before every (sort_key, id), so bisect_left
+        # counts strictly-lower keys only
+        return bisect_left(self._waiting, (patient.sort_key,))
+
+    def changed_since(self, version: int) -> Optional[List[Patient]]:
+        """
+        Patients (any status) changed after `version`, most recent first.
+        None if `version` is from the future, e.g. another server process.
+        """
+        with self._lock:
+            if version > self.version:
+                return None
+            changed = []
+            for pid in reversed(self._changed):
+                if self._changed[pid] <= version:
+                    break
+                changed.append(self._patients[pid])
+            return changed
 
     def get_delayed_patients(self) -> List[dict]:
         """Get patients exceeding ESI wait time thresholds"""
-        delayed = [
-            p for p in self._patients.values()
-            if p.is_delayed() and p.department == self.department
-        ]
-        delayed.sort(key=lambda p: (p.esi, p.arrival_ts))
-        return [p.to_dict() for p in delayed]
+        now = datetime.now(UTC)
+        # Walk the (cached) priority-ordered list of every status rather than
+        # filtering and re-sorting all patients; is_delayed is one compare
+        patients = self._ordered(sorted(self._by_status))
+        return [p.to_dict(now) for p in patients if p.is_delayed(now)]
 
     def get_queue(self) -> List[dict]:
         """Legacy method - returns patients awaiting triage"""
@@ -176,18 +357,12 @@ class SmartQueue:
         rooms_available = max(1, int(rooms_available))
         avg_service_min = max(1, int(avg_service_min))
 
-        queue = [
-            p for p in self._patients.values()
-            if p.status == PatientStatus.AWAITING_TRIAGE.value and p.department == self.department
-        ]
-        queue.sort(key=lambda p: (p.esi, p.arrival_ts))
-
-        for index, p in enumerate(queue):
-            if p.id == patient_id:
-                people_ahead = index
-                eta = int((people_ahead * avg_service_min) / rooms_available)
-                return max(0, eta)
+        keys = self._by_status.get(PatientStatus.AWAITING_TRIAGE.value, [])
+        p = self._patients.get(patient_id)
+        if p and p.status == PatientStatus.AWAITING_TRIAGE.value:
+            people_ahead = bisect_left(keys, self._status_key(p))
+            eta = int((people_ahead * avg_service_min) / rooms_available)
+            return max(0, eta)
 
         # If they aren't in the waiting queue, ETA is 0 for now
         return 0
-
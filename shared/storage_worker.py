@@ -0,0 +1,204 @@
+# storage_worker.py
+"""
+Background SQLite writer.
+
+FastAPI handlers in main.py are `async def`, so a blocking commit inside
+one of them stalls every other request and Socket.IO emit. StorageWorker
+owns a dedicated write connection on its own thread: stores push
+(sql, params) pairs onto a queue and return immediately, and the worker
+drains whatever has piled up and commits it as one transaction.
+
+Every submitted unit gets a sequence number. A request that wants to know
+its writes landed opens a write scope with track() first; flush() /
+wait_flush() then wait for that scope's own units only (not for writes
+other requests queued afterwards) and raise StorageWriteError if one of
+them was rejected.
+
+Usage:
+    worker = StorageWorker(DB_PATH)
+    store = SQLiteBedStore(writer=worker)
+
+    worker.track()            # once per request
+    store.set_status(...)
+    await worker.wait_flush()  # raises if that write failed
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+import traceback
+from contextvars import ContextVar
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, List, Optional, Tuple
+
+from db_pool import apply_pragmas
+
+WriteOp = Tuple[str, tuple]
+
+
+class StorageWriteError(Exception):
+    """A queued write was rejected by SQLite and has been dropped."""
+
+
+class _WriteScope:
+    """Units submitted by one request: the newest sequence number, first error."""
+
+    __slots__ = ("last", "error")
+
+    def __init__(self) -> None:
+        self.last = 0
+        self.error: Optional[BaseException] = None
+
+
+# (sequence number, statements, submitting scope)
+_Unit = Tuple[int, List[WriteOp], Optional[_WriteScope]]
+
+# The current request's scope. A mutable object rather than a plain value so
+# submits from run_in_threadpool / to_thread (which run in a copy of the
+# context) still record into the scope the handler opened.
+_scope: ContextVar[Optional[_WriteScope]] = ContextVar("storage_write_scope", default=None)
+
+
+class StorageWorker:
+    """
+    Single writer thread with burst batching.
+
+    Each submit_many() call is one unit of work. Every burst of queued
+    units runs inside a single transaction; consecutive statements with the
+    same SQL text are sent through one executemany(). Statement order is
+    preserved. If the burst fails it is rolled back and replayed one unit
+    per transaction, so only the offending unit is dropped.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._queue: "queue.SimpleQueue[Optional[_Unit]]" = queue.SimpleQueue()
+        # Sequence numbers: last handed out, and last committed (or dropped).
+        # Units are processed in submit order, so everything <= _done is done.
+        self._submitted = 0
+        self._done = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="storage-worker", daemon=True
+        )
+        self._thread.start()
+
+    # ------------- producer side -------------
+
+    def track(self) -> None:
+        """
+        Start a write scope for the current request (context). Later
+        submits from this context, including from threads it hands work
+        to, are what flush()/wait_flush() wait on and report errors for.
+        """
+        _scope.set(_WriteScope())
+
+    def submit_many(self, ops: Iterable[WriteOp]) -> int:
+        """
+        Queue a group of statements to be committed together. Returns the
+        unit's sequence number (0 if there was nothing to queue).
+        """
+        batch = list(ops)
+        if not batch:
+            return 0
+        scope = _scope.get()
+        # Number and enqueue under one lock so queue order is number order
+        with self._cond:
+            self._submitted += 1
+            seq = self._submitted
+            self._queue.put((seq, batch, scope))
+        if scope is not None:
+            scope.last = seq
+        return seq
+
+    def sync(self) -> None:
+        """
+        Block until every unit submitted before this call has been
+        committed or dropped. For stores that must see queued writes before
+        reading; never raises for failed writes.
+        """
+        self._wait_for(self._submitted)
+
+    def flush(self) -> None:
+        """
+        Block until this request's writes (see track()) have been committed,
+        raising StorageWriteError if any of them failed. Outside a scope,
+        same as sync().
+        """
+        scope = _scope.get()
+        if scope is None:
+            self.sync()
+            return
+        self._wait_for(scope.last)
+        error, scope.error = scope.error, None
+        if error is not None:
+            raise StorageWriteError(str(error)) from error
+
+    async def wait_flush(self) -> None:
+        """
+        flush() without blocking the event loop.
+        """
+        await asyncio.to_thread(self.flush)
+
+    def close(self) -> None:
+        """
+        Commit outstanding writes and stop the worker thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _wait_for(self, seq: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._done >= seq)
+
+    # ------------- worker thread -------------
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path)
+        apply_pragmas(conn, self.db_path)
+
+        stopping = False
+        while not stopping:
+            burst = [self._queue.get()]
+            # Grab everything else that queued up while we were busy
+            while True:
+                try:
+                    burst.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            units = [b for b in burst if b is not None]
+            stopping = len(units) != len(burst)
+            if not units:
+                continue
+
+            try:
+                self._execute(conn, [op for _, ops, _ in units for op in ops])
+            except Exception:
+                # The burst was rolled back; replay it unit by unit so one
+                # bad write doesn't take other requests' writes with it
+                for _, ops, scope in units:
+                    try:
+                        self._execute(conn, ops)
+                    except Exception as exc:
+                        traceback.print_exc()
+                        if scope is not None and scope.error is None:
+                            scope.error = exc
+            finally:
+                with self._cond:
+                    self._done = units[-1][0]
+                    self._cond.notify_all()
+
+        # Fold the WAL back into the main database file on shutdown, so the
+        # .db on disk is current even though the pool's connections stay open
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, ops: List[WriteOp]) -> None:
+        """Run `ops` as one transaction (rolled back if any statement fails)"""
+        with conn:
+            for sql, group in groupby(ops, key=itemgetter(0)):
+                conn.executemany(sql, [params for _, params in group])
@@ -0,0 +1,13 @@
+# conftest.py
+"""
+The modules import each other by bare name (main.py puts shared/ on
+sys.path the same way), so make both source folders importable here.
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+for folder in ("shared", "backend"):
+    path = str(ROOT / folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,31 @@
+# test_bed.py
+import pytest
+
+from bed import Bed, feature_set
+from bed_db import SQLiteBedStore, decode_features, encode_features
+
+
+def test_features_round_trip_through_the_column_encoding():
+    features = feature_set(["cardiac_monitor", "negative_pressure"])
+    assert decode_features(encode_features(features)) == features
+
+
+def test_feature_name_containing_separator_is_rejected():
+    with pytest.raises(ValueError):
+        Bed(bed_type="ED", section="A1", features=["a|b"])
+    bed = Bed(bed_type="ED", section="A1")
+    with pytest.raises(ValueError):
+        bed.features = ["a|b"]
+
+
+def test_empty_feature_name_is_rejected():
+    with pytest.raises(ValueError):
+        Bed(bed_type="ED", section="A1", features=["", "x"])
+
+
+def test_required_feature_containing_separator_is_rejected():
+    store = SQLiteBedStore(":memory:")
+    store.insert_bed(Bed(bed_type="ED", section="A1", features=["a", "b"]))
+    with pytest.raises(ValueError):
+        store.find_open_bed(None, None, ["a|b"])
+    assert store.find_open_bed(None, None, ["a", "b"]) is not None
@@ -0,0 +1,39 @@
+# test_emit_batcher.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("socketio")
+
+from emit_batcher import DELTA_EVENT, EmitBatcher
+
+
+class FlakySio:
+    """Records emits; the first one raises"""
+
+    def __init__(self):
+        self.sent = []
+        self.calls = 0
+
+    async def emit(self, event, data):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("transport closed")
+        self.sent.append((event, data))
+
+
+def test_batches_keep_flowing_after_a_failed_emit():
+    async def scenario():
+        sio = FlakySio()
+        batcher = EmitBatcher(sio, window=0.01)
+        batcher.start()
+        batcher.push('patient:updated', {'id': 'p1'})
+        await asyncio.sleep(0.05)
+        batcher.push('patient:updated', {'id': 'p2'})
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return sio
+
+    sio = asyncio.run(scenario())
+    assert sio.calls == 2
+    assert sio.sent == [(DELTA_EVENT, '{"patient:updated":[{"id":"p2"}]}')]
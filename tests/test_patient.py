@@ -0,0 +1,39 @@
+# test_patient.py
+from datetime import datetime, timedelta, timezone
+
+from patient import Patient
+
+
+def _patient(esi, arrival_ts):
+    return Patient(
+        name="Test", esi=esi, chief_complaint="x", age=40, gender="F", arrival_ts=arrival_ts,
+    )
+
+
+def test_sent_sort_key_is_a_safe_javascript_integer():
+    now = datetime.now(timezone.utc)
+    for esi in range(1, 6):
+        assert _patient(esi, now).to_dict()["sort_key"] < 2**53
+
+
+def test_sent_sort_key_orders_by_esi_then_arrival():
+    now = datetime.now(timezone.utc)
+    earlier, later = now - timedelta(minutes=5), now
+    keys = [
+        _patient(esi, ts).to_dict()["sort_key"]
+        for esi, ts in ((1, later), (2, earlier), (2, later), (3, earlier))
+    ]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_iso_timestamps_round_trip_through_the_store():
+    from patient_db import SQLitePatientStore
+
+    store = SQLitePatientStore(":memory:")
+    p = _patient(2, datetime.now(timezone.utc))
+    p.update_status("TRIAGED")
+    store.insert_patient(p)
+    loaded = store.get_patient(p.id)
+    assert loaded.arrival_ts == p.arrival_ts
+    assert loaded.timestamps == p.timestamps
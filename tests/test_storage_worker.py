@@ -0,0 +1,71 @@
+# test_storage_worker.py
+import sqlite3
+import threading
+
+import pytest
+
+from storage_worker import StorageWorker, StorageWriteError
+
+INSERT_SQL = "INSERT INTO t (id, esi) VALUES (?, ?)"
+
+
+@pytest.fixture
+def worker(tmp_path):
+    db_path = str(tmp_path / "t.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (id TEXT PRIMARY KEY, esi INTEGER CHECK(esi BETWEEN 1 AND 5))")
+    conn.commit()
+    conn.close()
+    w = StorageWorker(db_path)
+    yield w
+    w.close()
+
+
+def _ids(worker):
+    worker.sync()
+    conn = sqlite3.connect(worker.db_path)
+    try:
+        return sorted(r[0] for r in conn.execute("SELECT id FROM t WHERE id NOT LIKE 'filler%'"))
+    finally:
+        conn.close()
+
+
+def test_failed_unit_does_not_drop_the_rest_of_its_burst(worker):
+    # A big first unit keeps the worker busy so the next ones share a burst
+    worker.submit_many((INSERT_SQL, (f"filler{i}", 1)) for i in range(20000))
+    results = {}
+
+    def request(pid, esi):
+        worker.track()
+        worker.submit_many([(INSERT_SQL, (pid, esi))])
+        try:
+            worker.flush()
+            results[pid] = "ok"
+        except StorageWriteError:
+            results[pid] = "failed"
+
+    threads = [
+        threading.Thread(target=request, args=args)
+        for args in (("good", 2), ("bad", 0), ("also-good", 3))
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {"good": "ok", "bad": "failed", "also-good": "ok"}
+    assert _ids(worker) == ["also-good", "good"]
+
+
+def test_flush_outside_a_scope_does_not_raise(worker):
+    worker.submit_many([(INSERT_SQL, ("bad", 0))])
+    worker.flush()
+    assert _ids(worker) == []
+
+
+def test_scope_error_is_reported_once(worker):
+    worker.track()
+    worker.submit_many([(INSERT_SQL, ("bad", 0))])
+    with pytest.raises(StorageWriteError):
+        worker.flush()
+    worker.flush()